@@ -11,37 +11,75 @@ try:
 except:
 	raise Exception("Pythonista 3 is required.")
 
+import asyncio
+import collections
+import ctypes
+import ctypes.util
+import functools
+import gzip
+import hashlib
 import inspect
+import io
+import json
+import mimetypes
+import mmap
 import os
+import posixpath
+import re
+import select
+import shutil
+import socket
+import struct
 import sys
+import tempfile
 import threading
-from urllib.parse import urlparse, quote as urlencode, unquote as urldecode
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse, parse_qsl, quote as urlencode, unquote as urldecode
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
 
 import requests
+from requests.adapters import HTTPAdapter, Retry
 
 import bottle
-from bottle import Bottle, default_app, BaseTemplate
+from bottle import Bottle, default_app
 from bottle import WSGIRefServer
 from bottle import (
  request,
  response,
  route,
  static_file,
- mako_template as template,
 )
 
 from mako.lookup import TemplateLookup
+from mako.exceptions import TopLevelLookupException
 from mako import parsetree
 from mako.lexer import Lexer
 
+try:
+	import brotli
+except ImportError:
+	brotli = None
+
 import logging
 
 log = logging.getLogger(__name__)
 
+# generated directories under the app root, never indexed, served or watched
+excluded_dirs = frozenset(('static-cache', 'views-cache', 'proxy-cache', '__pycache__'))
+
+
+def is_excluded_dir(name):
+	return name in excluded_dirs or name.startswith('.')
+
 try:
 	from .WKWebView import *
+	from .WKMessage import *
 except:
 	from WKWebView import *
+	from WKMessage import *
 
 
 class WKAppWebView(WKWebView):
@@ -89,52 +127,662 @@ class WKAppView(ui.View):
 		self.app.cleanup()
 
 
+class WKAppThreadedServer(bottle.ServerAdapter):
+	# wsgiref based server handling requests on a bounded pool of worker threads, so parallel asset
+	# requests of a page are not serialised on the accept thread
+
+	def __init__(self, host='127.0.0.1', port=8080, workers=16, backlog=64, **options):
+		super().__init__(host, port, **options)
+		self.workers = workers
+		self.backlog = backlog
+		self.srv = None
+		# set once the socket is bound and listening, port is then the bound port
+		self.bound = threading.Event()
+
+	def run(self, handler):
+		quiet = self.quiet
+		workers = self.workers
+
+		class RequestHandler(WSGIRequestHandler):
+
+			def address_string(self):
+				return self.client_address[0]
+
+			def log_request(self, *args, **kwargs):
+				if not quiet:
+					return super().log_request(*args, **kwargs)
+
+		class Server(WSGIServer):
+
+			request_queue_size = self.backlog
+
+			def server_activate(self):
+				super().server_activate()
+				self.executor = ThreadPoolExecutor(max_workers=workers,
+				                                   thread_name_prefix='WKAppServer')
+				# accepting blocks once every worker is busy and as many requests are waiting
+				self.slots = threading.BoundedSemaphore(workers * 2)
+				self.active = 0
+				self.idle = threading.Condition()
+
+			def process_request(self, request, client_address):
+				self.slots.acquire()
+				with self.idle:
+					self.active += 1
+				self.executor.submit(self.process_request_worker, request, client_address)
+
+			def process_request_worker(self, request, client_address):
+				try:
+					self.finish_request(request, client_address)
+				except Exception:
+					self.handle_error(request, client_address)
+				finally:
+					self.shutdown_request(request)
+					self.slots.release()
+					with self.idle:
+						self.active -= 1
+						self.idle.notify_all()
+
+			def drain(self, timeout=None):
+				# waits for accepted requests to complete, False if some were still running at timeout
+				with self.idle:
+					return self.idle.wait_for(lambda: self.active == 0, timeout)
+
+			def server_close(self):
+				super().server_close()
+				# not created when binding failed
+				if hasattr(self, 'executor'):
+					self.executor.shutdown(wait=False, cancel_futures=True)
+
+		self.srv = make_server(self.host, self.port, handler, Server, RequestHandler)
+		self.port = self.srv.server_port
+		self.bound.set()
+		self.srv.serve_forever()
+
+	def shutdown(self, timeout=5.0):
+		# stops accepting, then lets accepted requests finish for up to timeout seconds
+		self.srv.shutdown()
+		drained = self.srv.drain(timeout)
+		if not drained:
+			log.warning(f'WKApp - Server closing with {self.srv.active} requests still running')
+		self.srv.server_close()
+		return drained
+
+
 class WKAppServer(threading.Thread):
 
-	def __init__(self, app, host='localhost', port=8080, server_class=None):
-		threading.Thread.__init__(self)
+	# server_class names, other names are looked up in bottle.server_names
+	backends = {
+	 'threaded': WKAppThreadedServer,
+	 'wsgiref': WSGIRefServer,
+	}
+
+	def __init__(self, app, host='localhost', port=8080, server_class=None, debug=False,
+	             port_fallback=True, **options):
+		threading.Thread.__init__(self, daemon=True)
 		self.app = app
 		self.host = host
 		self.port = port
+		self.requested_port = port
+		self.port_fallback = port_fallback
 		self.server_class = server_class
+		self.debug = debug
+		self.options = options
+		self.server = None
+		self.error = None
+		self.started = None
+		self.ready_time = None
+
+	def select_port(self):
+		# the requested port if it can be bound, otherwise a free one chosen by the os
+		if not self.port_fallback or self.port == 0:
+			return self.port
+		for port in (self.port, 0):
+			try:
+				with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+					probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+					probe.bind((self.host, port))
+					port = probe.getsockname()[1]
+			except OSError as e:
+				log.warning(f'WKApp - Server port {port} unavailable: {e}')
+				continue
+			if port != self.port:
+				log.warning(f'WKApp - Server port {self.port} busy, using {port}')
+			return port
+		return self.port
+
+	def start(self):
+		self.started = time.perf_counter()
+		self.port = self.select_port()
+		super().start()
+
+	def wait_ready(self, timeout=10.0):
+		# True once the server accepts connections, False if it failed or did not bind in time
+		deadline = time.monotonic() + timeout
+		while time.monotonic() < deadline:
+			if not self.error is None or not self.is_alive():
+				return False
+			bound = getattr(self.server, 'bound', None)
+			if isinstance(bound, threading.Event):
+				if bound.wait(0.01):
+					self.port = self.server.port
+					break
+				continue
+			# backends without a bind signal are polled, on the port they bound when 0 was requested
+			if self.port == 0:
+				self.port = self.bound_port()
+				if self.port == 0:
+					time.sleep(0.01)
+					continue
+			try:
+				with socket.create_connection((self.host, self.port), timeout=0.1):
+					break
+			except OSError:
+				time.sleep(0.01)
+		else:
+			return False
+		if self.ready_time is None:
+			self.ready_time = time.perf_counter() - self.started
+		return True
 
-	def run(self):
-		log.warning(f'WKApp - Server Starting...')
-		if self.server_class is None:
-			self.server_class = WSGIRefServer
+	def bound_port(self):
+		# port of the backend's listening socket, 0 until it has bound
+		srv = getattr(self.server, 'srv', None)
+		port = getattr(srv, 'server_port', None)
+		if port is None:
+			port = getattr(self.server, 'port', 0)
+		return port or 0
+
+	def create_server(self):
 		server_class = self.server_class
-		self.server = server_class(port=self.port)
-		self.app.run(host=self.host, port=self.port, server=self.server, debug=True)
-
-	def get_id(self):
-		if hasattr(self, '_thread_id'):
-			return self._thread_id
-		for id, thread in threading._active.items():
-			if thread is self:
-				return id
-		return None
+		if server_class is None:
+			server_class = 'threaded'
+		if isinstance(server_class, str):
+			name = server_class
+			server_class = self.backends.get(name, None) or bottle.server_names.get(name, None)
+			if server_class is None:
+				raise ValueError(f'Unknown server backend {name}')
+		if isinstance(server_class, bottle.ServerAdapter):
+			return server_class
+		options = self.options if server_class is WKAppThreadedServer else {}
+		return server_class(host=self.host, port=self.port, **options)
 
-	def stop(self):
+	def run(self):
+		log.warning(f'WKApp - Server Starting...')
+		try:
+			self.server = self.create_server()
+			self.app.run(server=self.server, debug=self.debug, quiet=not self.debug)
+		except Exception as e:
+			self.error = e
+			log.warning(f'WKApp - Server failed {e}')
+
+	def stop(self, timeout=5.0):
 		log.warning(f'WKApp - Server Stopping...')
-		if hasattr(self, 'server') and hasattr(self.server, 'srv'):
-			server = self.server.srv
-			if hasattr(server, 'shutdown'):
-				server.shutdown()
-			if hasattr(server, 'close'):
-				server.close()
-			elif hasattr(server, 'server_close'):
+		if self.is_alive() and self.error is None:
+			self.wait_ready(timeout)
+		if self.server is None or not self.is_alive():
+			log.warning(f'WKApp - Server not running.')
+			return
+		server = getattr(self.server, 'srv', None)
+		if isinstance(self.server, WKAppThreadedServer) and not server is None:
+			self.server.shutdown(timeout)
+		elif not server is None and hasattr(server, 'shutdown'):
+			server.shutdown()
+			if hasattr(server, 'server_close'):
 				server.server_close()
+			elif hasattr(server, 'close'):
+				server.close()
+		elif hasattr(self.server, 'shutdown'):
+			self.server.shutdown()
 		else:
-			thread_id = self.get_id()
-			if not thread_id is None:
-				res = ctypes.pythonapi.PyThreadState_SetAsyncExc(
-				 thread_id, ctypes.py_object(KeyboardInterrupt))
-				if res > 1:
-					ctypes.pythonapi.PyThreadState_SetAsyncExc(thread_id, 0)
-		self.join()
+			log.warning(f'WKApp - Server backend {type(self.server).__name__} cannot be stopped, '
+			            f'leaving its daemon thread running')
+			return
+		self.join(timeout)
 		log.warning(f'WKApp - Server Stopped.')
 
 
+class WKAppProxyCache:
+
+	hop_headers = ('connection', 'keep-alive', 'transfer-encoding', 'content-encoding',
+	               'content-length', 'date', 'age', 'set-cookie')
+
+	def __init__(self, path, max_size=256 * 1024 * 1024, offline=False):
+		self.path = path
+		self.max_size = max_size
+		self.offline = offline
+		self.lock = threading.RLock()
+		self.index_path = os.path.join(self.path, 'index.json')
+		self.entries = None
+		# access times from hits are written to the index at most once per access_resolution
+		# seconds, and by flush(), so eviction after a restart still follows recent use
+		self.access_resolution = 5.0
+		self.saved = 0.0
+		self.dirty = False
+		self.hits = 0
+		self.misses = 0
+		self.revalidated = 0
+
+	@staticmethod
+	def header(headers, name, default=None):
+		name = name.lower()
+		for key, value in headers.items():
+			if key.lower() == name:
+				return value
+		return default
+
+	@staticmethod
+	def cache_control(headers):
+		directives = {}
+		value = WKAppProxyCache.header(headers, 'Cache-Control', '')
+		for directive in value.split(','):
+			directive = directive.strip().lower()
+			if not directive:
+				continue
+			key, _, arg = directive.partition('=')
+			directives[key.strip()] = arg.strip().strip('"')
+		return directives
+
+	@staticmethod
+	def parse_date(value):
+		if value is None:
+			return None
+		try:
+			return parsedate_to_datetime(value).timestamp()
+		except (TypeError, ValueError):
+			return None
+
+	def load(self):
+		with self.lock:
+			if self.entries is None:
+				self.entries = {}
+				if os.path.exists(self.index_path):
+					try:
+						with open(self.index_path, 'r') as index_file:
+							self.entries = json.load(index_file)
+					except Exception as e:
+						log.warning(f'WKAppProxyCache - Index unreadable, starting empty {e}')
+			return self.entries
+
+	def save(self):
+		with self.lock:
+			os.makedirs(self.path, exist_ok=True)
+			fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+			with os.fdopen(fd, 'w') as index_file:
+				json.dump(self.entries, index_file)
+			os.replace(tmp, self.index_path)
+			self.saved = time.time()
+			self.dirty = False
+
+	def flush(self):
+		with self.lock:
+			if self.dirty:
+				self.save()
+
+	def blob_path(self, digest):
+		return os.path.join(self.path, digest[:2], digest)
+
+	def lookup(self, url):
+		with self.lock:
+			entry = self.load().get(url, None)
+			if not entry is None:
+				if not os.path.exists(self.blob_path(entry['digest'])):
+					del self.entries[url]
+					self.dirty = True
+					return None
+				now = time.time()
+				entry['accessed'] = now
+				self.dirty = True
+				if now - self.saved >= self.access_resolution:
+					self.save()
+			return entry
+
+	def is_fresh(self, entry):
+		return time.time() < entry['expires']
+
+	def conditional_headers(self, entry):
+		headers = {}
+		if entry.get('etag'):
+			headers['If-None-Match'] = entry['etag']
+		if entry.get('last_modified'):
+			headers['If-Modified-Since'] = entry['last_modified']
+		return headers
+
+	def expires(self, headers, now):
+		directives = self.cache_control(headers)
+		if 'no-cache' in directives:
+			return now
+		if 'immutable' in directives:
+			return now + 365 * 24 * 60 * 60
+		if 'max-age' in directives:
+			try:
+				return now + int(directives['max-age'])
+			except ValueError:
+				return now
+		expires = self.parse_date(self.header(headers, 'Expires'))
+		if not expires is None:
+			return expires
+		last_modified = self.parse_date(self.header(headers, 'Last-Modified'))
+		if not last_modified is None:
+			return now + max(0, now - last_modified) / 10 # heuristic freshness (RFC 9111 4.2.2)
+		return now
+
+	def is_cacheable(self, method, status, headers):
+		if method != 'GET' or status != 200:
+			return False
+		directives = self.cache_control(headers)
+		if 'no-store' in directives:
+			return False
+		if self.header(headers, 'Vary', '').strip() == '*':
+			return False
+		return True
+
+	def store(self, url, status, headers, iterable):
+		# tees iterable into a temporary file, the entry is only committed if it is fully consumed
+		os.makedirs(self.path, exist_ok=True)
+		fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+		digest = hashlib.sha256()
+		size = 0
+		complete = False
+		try:
+			with os.fdopen(fd, 'wb') as blob_file:
+				for data in iterable:
+					blob_file.write(data)
+					digest.update(data)
+					size += len(data)
+					yield data
+			complete = True
+		finally:
+			if complete:
+				self.commit(url, status, headers, tmp, digest.hexdigest(), size)
+			elif os.path.exists(tmp):
+				os.remove(tmp)
+
+	def commit(self, url, status, headers, tmp, digest, size):
+		now = time.time()
+		stored_headers = {k: v for k, v in headers.items() if not k.lower() in self.hop_headers}
+		entry = {
+		 'digest': digest,
+		 'size': size,
+		 'status': status,
+		 'headers': stored_headers,
+		 'etag': self.header(headers, 'ETag'),
+		 'last_modified': self.header(headers, 'Last-Modified'),
+		 'stored': now,
+		 'expires': self.expires(headers, now),
+		 'accessed': now,
+		}
+		with self.lock:
+			blob_path = self.blob_path(digest)
+			if os.path.exists(blob_path):
+				os.remove(tmp)
+			else:
+				os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+				os.replace(tmp, blob_path)
+			self.load()[url] = entry
+			self.evict()
+			self.save()
+
+	def refresh(self, url, headers):
+		# a 304 revalidation, update freshness and validators from the new response headers
+		with self.lock:
+			entry = self.load().get(url, None)
+			if entry is None:
+				return None
+			now = time.time()
+			entry['expires'] = self.expires(headers, now)
+			entry['etag'] = self.header(headers, 'ETag', entry['etag'])
+			entry['last_modified'] = self.header(headers, 'Last-Modified', entry['last_modified'])
+			self.revalidated += 1
+			self.save()
+			return entry
+
+	def evict(self):
+		with self.lock:
+			entries = self.load()
+			sizes = {}
+			for entry in entries.values():
+				sizes[entry['digest']] = entry['size']
+			total = sum(sizes.values())
+			for url in sorted(entries, key=lambda url: entries[url]['accessed']):
+				if total <= self.max_size:
+					break
+				digest = entries.pop(url)['digest']
+				if any(entry['digest'] == digest for entry in entries.values()):
+					continue
+				total -= sizes.pop(digest)
+				blob_path = self.blob_path(digest)
+				if os.path.exists(blob_path):
+					os.remove(blob_path)
+
+	def read(self, entry, chunk_size=65536):
+		size = entry['size']
+		if size == 0:
+			return
+		with open(self.blob_path(entry['digest']), 'rb') as blob_file:
+			with mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_READ) as blob:
+				for offset in range(0, size, chunk_size):
+					yield blob[offset:offset + chunk_size]
+
+	def clear(self):
+		with self.lock:
+			shutil.rmtree(self.path, ignore_errors=True)
+			self.entries = {}
+
+
+class WKAppInotify:
+
+	IN_MODIFY = 0x00000002
+	IN_CLOSE_WRITE = 0x00000008
+	IN_MOVED_FROM = 0x00000040
+	IN_MOVED_TO = 0x00000080
+	IN_CREATE = 0x00000100
+	IN_DELETE = 0x00000200
+	IN_ISDIR = 0x40000000
+	mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+	event = struct.Struct('iIII')
+
+	def __init__(self, libc, fd, ignore):
+		self.libc = libc
+		self.fd = fd
+		self.ignore = ignore
+		self.watches = {}
+
+	@classmethod
+	def create(cls, directories, ignore=()):
+		# inotify is only available on linux, callers fall back to polling when None is returned
+		if not sys.platform.startswith('linux'):
+			return None
+		try:
+			libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+			fd = libc.inotify_init1(os.O_CLOEXEC)
+		except (OSError, AttributeError):
+			return None
+		if fd < 0:
+			return None
+		inotify = cls(libc, fd, ignore)
+		for directory in directories:
+			inotify.add(directory)
+		return inotify
+
+	def add(self, directory):
+		for root, dirs, files in os.walk(directory):
+			dirs[:] = [d for d in dirs if not d in self.ignore and not is_excluded_dir(d)]
+			wd = self.libc.inotify_add_watch(self.fd, os.fsencode(root), self.mask)
+			if wd >= 0:
+				self.watches[wd] = root
+
+	def wait(self, timeout):
+		changed = set()
+		readable, _, _ = select.select([self.fd], [], [], timeout)
+		while readable:
+			data = os.read(self.fd, 64 * 1024)
+			offset = 0
+			while offset < len(data):
+				wd, mask, cookie, length = self.event.unpack_from(data, offset)
+				offset += self.event.size
+				name = data[offset:offset + length].rstrip(b'\0')
+				offset += length
+				root = self.watches.get(wd, None)
+				if root is None or not name:
+					continue
+				path = os.path.join(root, os.fsdecode(name))
+				if mask & self.IN_ISDIR:
+					if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+						self.add(path)
+					continue
+				changed.add(path)
+			# coalesce bursts of events from a single save
+			readable, _, _ = select.select([self.fd], [], [], 0.05)
+		return changed
+
+	def close(self):
+		os.close(self.fd)
+
+
+class WKAppWatcher(threading.Thread):
+
+	ignore = excluded_dirs
+
+	def __init__(self, directories, callback, interval=1.0):
+		super().__init__()
+		self.daemon = True
+		self.directories = [d for d in directories if os.path.isdir(d)]
+		self.callback = callback
+		self.interval = interval
+		self.running = False
+		self.stop_event = threading.Event()
+		self.mtimes = {}
+
+	def scan(self):
+		mtimes = {}
+		for directory in self.directories:
+			for root, dirs, files in os.walk(directory):
+				dirs[:] = [d for d in dirs if not d in self.ignore and not is_excluded_dir(d)]
+				for name in files:
+					path = os.path.join(root, name)
+					try:
+						mtimes[path] = os.stat(path).st_mtime_ns
+					except OSError:
+						pass
+		return mtimes
+
+	def changes(self):
+		mtimes = self.scan()
+		changed = set(path for path, mtime in mtimes.items() if self.mtimes.get(path, None) != mtime)
+		changed.update(set(self.mtimes) - set(mtimes))
+		self.mtimes = mtimes
+		return changed
+
+	def run(self):
+		self.running = True
+		inotify = WKAppInotify.create(self.directories, self.ignore)
+		if inotify is None:
+			self.mtimes = self.scan()
+		log.warning(f'WKApp - Watching {self.directories} ' + ('(inotify)' if inotify else '(polling)'))
+		try:
+			while self.running:
+				if inotify is None:
+					self.stop_event.wait(self.interval)
+					changed = self.changes()
+				else:
+					changed = inotify.wait(self.interval)
+				if changed and self.running:
+					try:
+						self.callback(changed)
+					except Exception as e:
+						log.error(f'WKApp - Watcher callback error {e}')
+		finally:
+			if not inotify is None:
+				inotify.close()
+		self.running = False
+
+	def stop(self, join=True):
+		self.running = False
+		self.stop_event.set()
+		if join and self.is_alive() and threading.current_thread() is not self:
+			self.join()
+
+
+class WKAppLoop(threading.Thread):
+
+	def __init__(self, max_pending=64, workers=4):
+		super().__init__()
+		self.daemon = True
+		self.loop = asyncio.new_event_loop()
+		self.executor = ThreadPoolExecutor(max_workers=workers)
+		self.ready = threading.Event()
+		# spawning threads block once max_pending fire and forget coroutines are outstanding,
+		# callers waiting on a result are already bounded by their own thread
+		self.pending = threading.BoundedSemaphore(max_pending)
+		self.max_pending = max_pending
+
+	def run(self):
+		asyncio.set_event_loop(self.loop)
+		self.loop.set_default_executor(self.executor)
+		self.loop.call_soon(self.ready.set)
+		try:
+			self.loop.run_forever()
+			tasks = asyncio.all_tasks(self.loop)
+			for task in tasks:
+				task.cancel()
+			if tasks:
+				self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+		finally:
+			self.loop.close()
+
+	def start(self):
+		super().start()
+		self.ready.wait()
+
+	def in_loop(self):
+		return threading.current_thread() is self
+
+	def submit(self, coro, bounded=False):
+		if self.in_loop():
+			return self.loop.create_task(coro)
+		if not bounded:
+			return asyncio.run_coroutine_threadsafe(coro, self.loop)
+		self.pending.acquire()
+		try:
+			future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+		except BaseException:
+			self.pending.release()
+			raise
+		future.add_done_callback(lambda future: self.pending.release())
+		return future
+
+	def run_coroutine(self, coro, timeout=None):
+		if self.in_loop():
+			raise RuntimeError('Cannot wait for a coroutine on the event loop thread, await it instead')
+		future = self.submit(coro)
+		try:
+			return future.result(timeout)
+		except FuturesTimeoutError:
+			future.cancel()
+			raise
+
+	def spawn(self, coro):
+
+		def done(future):
+			if not future.cancelled() and not future.exception() is None:
+				log.error(f'WKApp - Coroutine error {future.exception()}')
+
+		future = self.submit(coro, bounded=True)
+		future.add_done_callback(done)
+		return future
+
+	async def run_sync(self, func, *args):
+		return await self.loop.run_in_executor(None, functools.partial(func, *args))
+
+	def stop(self, join=True):
+		if self.loop.is_running():
+			self.loop.call_soon_threadsafe(self.loop.stop)
+		if join and self.is_alive() and not self.in_loop():
+			self.join()
+		self.executor.shutdown(wait=False)
+
+
 class WKConstants:
 	unspecfied = object()
 
@@ -204,6 +852,26 @@ class WKJavascript:
 		return WKJavascript.field(
 		 instance, WKJavascript.function_call(name, *args, chain=chain))
 
+	@staticmethod
+	def expression(script):
+		return script.strip().rstrip(';')
+
+	@staticmethod
+	def batch(scripts):
+		# evaluates each script in turn, returning a JSON array of their results.
+		# each script is passed as a string to a global (indirect) eval, so statements and trailing
+		# comments behave as when evaluated alone and a syntax error only nulls that script's result.
+		# values which cannot be serialised (elements, jQuery objects, functions) become null
+		code = [
+		 '(function(){var r=[];',
+		 'function v(x){if(x===undefined||typeof x==="function"||(x&&x.jquery)||x instanceof Node)return null;',
+		 'try{JSON.stringify(x);return x;}catch(e){return null;}}'
+		]
+		for script in scripts:
+			code.append(f'try{{r.push(v((0,eval)({json.dumps(script)})));}}catch(e){{r.push(null);}}')
+		code.append('return JSON.stringify(r);})();')
+		return '\n'.join(code)
+
 	@staticmethod
 	def jquery(selector):
 		return f'$("{selector}")'
@@ -213,6 +881,72 @@ class WKJavascript:
 		return WKJavascript.instance_call('document', 'getElementById', id)
 
 
+class WKJavascriptBatch:
+
+	def __init__(self, view, max_scripts=100, max_size=64 * 1024, max_delay=0.05):
+		self.view = view
+		self.js = view.js
+		self.max_scripts = max_scripts
+		self.max_size = max_size
+		self.max_delay = max_delay
+		self.scripts = []
+		self.size = 0
+		self.started = None
+		self.results = []
+		self.flushes = 0
+		self.parent = None
+
+	def __len__(self):
+		return len(self.scripts)
+
+	def add(self, script):
+		if len(self.scripts) == 0:
+			self.started = time.perf_counter()
+		self.scripts.append(script)
+		self.size += len(script)
+		index = len(self.results) + len(self.scripts) - 1
+		if len(self.scripts) >= self.max_scripts or self.size >= self.max_size \
+		  or time.perf_counter() - self.started >= self.max_delay:
+			self.flush()
+		return index
+
+	def flush(self):
+		scripts = self.scripts
+		if len(scripts) == 0:
+			return []
+		self.scripts = []
+		self.size = 0
+		self.started = None
+		value = self.view.webview().eval_js(self.js.batch(scripts))
+		self.flushes += 1
+		try:
+			results = json.loads(value) if value else []
+		except ValueError:
+			results = []
+		if len(results) != len(scripts):
+			results = (results + [None] * len(scripts))[:len(scripts)]
+		self.results.extend(results)
+		return results
+
+	def result(self, index):
+		if index >= len(self.results):
+			self.flush()
+		return self.results[index]
+
+	def __enter__(self):
+		self.parent = self.view.batching
+		self.view._batch_local.batch = self
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		try:
+			self.flush()
+		finally:
+			self.view._batch_local.batch = self.parent
+			self.parent = None
+		return False
+
+
 class WKElementsRef:
 
 	def __init__(self, view, selector, js=WKJavascript):
@@ -226,32 +960,168 @@ class WKElementsRef:
 		return self.view.eval_js(script)
 
 	def get(self, name, typ=str, default=WKConstants.unspecfied):
-		value = self.call(name)
+		script = self.js.instance_call(self.elem, name)
+		batch = self.view.batching
+		if batch is None:
+			value = self.view.eval_js(script)
+		else:
+			value = batch.result(batch.add(script))
 		return self.js.value_to_py(value, typ, default)
 
 	def set(self, name, value):
 		self.call(name, value)
 
 
+class WKInvokeTable:
+	# precomputed javascript invoke targets of a class, built once per class
+	#
+	# a target is invokable when it is named in the classes 'invokable' attribute or is a public
+	# method defined below 'base', so base class internals (eval_js, event, ...) and instance
+	# attributes are not reachable from javascript. Hooks the framework calls (view events like
+	# on_GET and on_evict, cache_key, webview delegate and message handlers) are only invokable
+	# when listed in 'invokable'
+
+	class Entry:
+
+		def __init__(self, name, func, signature, bind_self):
+			self.name = name
+			self.func = func
+			self.signature = signature
+			self.bind_self = bind_self
+
+		def __call__(self, instance, args, kwargs):
+			try:
+				self.signature.bind(*args, **kwargs)
+			except TypeError as e:
+				raise TypeError(f"Invalid arguments for '{self.name}{self.signature}': {e}") from None
+			if self.bind_self:
+				return self.func(instance, *args, **kwargs)
+			return self.func(*args, **kwargs)
+
+	hook_prefixes = ('on_', 'webview_')
+	hook_names = ('cache_key',)
+
+	_lock = threading.Lock()
+
+	def __init__(self, cls, base):
+		self.cls = cls
+		self.entries = {}
+		invokable = set()
+		for klass in cls.__mro__:
+			invokable.update(klass.__dict__.get('invokable', ()))
+		names = set(invokable)
+		for klass in cls.__mro__:
+			if klass is base or issubclass(base, klass):
+				continue
+			# names the base defines (hooks and settings like view_key) are only invokable when listed
+			names.update(name for name in klass.__dict__
+			             if not name.startswith('_') and not hasattr(base, name)
+			             and not self.is_hook(name))
+		for name in names:
+			entry = self.entry(cls, name)
+			if not entry is None:
+				self.entries[name] = entry
+
+	@classmethod
+	def is_hook(cls, name):
+		return name.startswith(cls.hook_prefixes) or name in cls.hook_names
+
+	@staticmethod
+	def entry(cls, name):
+		try:
+			attr = inspect.getattr_static(cls, name)
+		except AttributeError:
+			return None
+		if isinstance(attr, staticmethod):
+			func, bind_self = attr.__func__, False
+		elif isinstance(attr, classmethod):
+			func, bind_self = getattr(cls, name), False
+		elif inspect.isfunction(attr):
+			func, bind_self = attr, True
+		else:
+			return None
+		signature = inspect.signature(func)
+		if bind_self:
+			parameters = list(signature.parameters.values())[1:]
+			signature = signature.replace(parameters=parameters)
+		return WKInvokeTable.Entry(name, func, signature, bind_self)
+
+	@classmethod
+	def of(cls, klass, base):
+		# tables are stored on the class itself, subclasses get their own table
+		table = klass.__dict__.get('_invoke_table', None)
+		if table is None:
+			with cls._lock:
+				table = klass.__dict__.get('_invoke_table', None)
+				if table is None:
+					table = cls(klass, base)
+					setattr(klass, '_invoke_table', table)
+		return table
+
+	def get(self, instance, name):
+		entry = self.entries.get(name, None)
+		if entry is None:
+			raise Exception(f"Target '{name}' is not invokable in context {instance}")
+		return functools.partial(self.invoke, instance, entry)
+
+	@staticmethod
+	def invoke(instance, entry, *args, **kwargs):
+		return entry(instance, args, kwargs)
+
+
 class WKView:
 
+	# names of additional methods javascript may invoke, public methods of view classes are invokable by default
+	invokable = ()
+
+	# identity of view instances, None keys views by path only, a sequence of query parameter names
+	# keeps an instance per path and values of those parameters, a callable view_key(path, query)
+	# returns a string distinguishing instances of the path
+	view_key = None
+
+	# when False a GET for an existing keyed view does not set query values or call on_GET again
+	refresh_on_get = True
+
+	# with WKApp(page_cache=True), views defining cache_key() returning a version of their state have
+	# rendered pages cached until the version changes, or for cache_ttl seconds if set
+	cache_ttl = None
+
+	# view classes get an instance __dict__ unless views are created with slots, see WKViews.create_view_type
+	__slots__ = ('app', 'url', 'path', 'template', 'js', '_batch_local', '__weakref__')
+
 	def __init__(self, app=None, url='', path='', template=None, js=WKJavascript):
 		self.app = app
 		self.url = url
 		self.path = path
 		self.template = template
 		self.js = js
+		self._batch_local = threading.local()
 		self.event('on_init')
 
 	def webview(self):
 		return self.app.app_webview
 
+	@property
+	def batching(self):
+		return getattr(self._batch_local, 'batch', None)
+
+	def batch(self, **kwargs):
+		# with view.batch(): collects eval_js scripts on this thread and evaluates them in one round trip
+		return WKJavascriptBatch(self, **kwargs)
+
 	def eval_js(self, script):
+		batch = self.batching
+		if not batch is None:
+			batch.add(script)
+			return None
 		return self.webview().eval_js(script)
 
 	def eval_js_async(self, script):
 		return self.webview().eval_js_async(script)
 
+	def eval_js_gather(self, scripts, timeout=None):
+		return self.webview().eval_js_gather(scripts, timeout)
+
 	def elements(self, selector):
 		return WKElementsRef(self, selector, self.js)
 
@@ -261,7 +1131,15 @@ class WKView:
 	def event(self, name, *args, **kwargs):
 		if hasattr(self, name):
 			func = getattr(self, name)
-			func(*args, **kwargs)
+			result = func(*args, **kwargs)
+			if inspect.isawaitable(result):
+				if self.app is None:
+					return asyncio.run(result)
+				return self.app.run_coroutine(result)
+			return result
+
+	async def eval_js_await(self, script, timeout=None):
+		return await self.webview().eval_js_await(script, timeout)
 
 
 class WKViewsLexer(Lexer):
@@ -324,6 +1202,9 @@ class WKViewsLexer(Lexer):
 		else:
 			return False
 
+	# bump when lexing changes so previously compiled view modules are not reused
+	version = '1'
+
 	@staticmethod
 	def preprocessor(template, *args, **kwargs):
 		#log.warning(f"WKViewsTemplate preprocess: {args} {kwargs}")
@@ -331,58 +1212,413 @@ class WKViewsLexer(Lexer):
 		return template
 
 
+class WKViewsModuleCache:
+
+	def __init__(self, directory, lexer_cls=WKViewsLexer):
+		self.directory = directory
+		self.lexer_cls = lexer_cls
+		self.locks = {}
+		self.lock = threading.Lock()
+		# set by module_writer, tells the loading thread its template was compiled
+		self.local = threading.local()
+
+	def template_lock(self, filename):
+		with self.lock:
+			lock = self.locks.get(filename, None)
+			if lock is None:
+				lock = threading.RLock()
+				self.locks[filename] = lock
+			return lock
+
+	def source_key(self, filename):
+		digest = hashlib.sha256()
+		digest.update(f'{self.lexer_cls.__name__}:{self.lexer_cls.version}:'.encode('utf8'))
+		with open(filename, 'rb') as source_file:
+			digest.update(source_file.read())
+		return digest.hexdigest()[:24]
+
+	def module_prefix(self, filename, uri):
+		name = uri.strip('/').replace('/', '_').replace('\\', '_')
+		location = hashlib.sha256(os.path.abspath(filename).encode('utf8')).hexdigest()[:8]
+		return f'{name}.{location}.'
+
+	def module_filename(self, filename, uri):
+		# used as TemplateLookup.modulename_callable, modules are keyed by source hash and lexer version
+		return os.path.join(self.directory, self.module_prefix(filename, uri) + self.source_key(filename) + '.py')
+
+	def module_writer(self, source, outputpath):
+		# only called by mako when a template is compiled, not when a cached module is loaded
+		self.local.compiled = True
+		directory = os.path.dirname(outputpath)
+		os.makedirs(directory, exist_ok=True)
+		fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+		with os.fdopen(fd, 'wb') as module_file:
+			module_file.write(source)
+		os.replace(tmp, outputpath)
+		# remove modules compiled from previous versions of the same template
+		name = os.path.basename(outputpath)
+		prefix = name[:name.rindex('.', 0, len(name) - 3) + 1]
+		for other in os.listdir(directory):
+			if other != name and other.startswith(prefix) and other.endswith('.py') \
+			  and other.count('.') == name.count('.'):
+				try:
+					os.remove(os.path.join(directory, other))
+				except OSError:
+					pass
+
+
+class WKViewsLookup(TemplateLookup):
+
+	def __init__(self, *args, module_cache=None, **kwargs):
+		self.module_cache = module_cache
+		if not module_cache is None:
+			kwargs.setdefault('module_directory', module_cache.directory)
+			kwargs.setdefault('modulename_callable', module_cache.module_filename)
+			kwargs.setdefault('module_writer', module_cache.module_writer)
+		super().__init__(*args, **kwargs)
+		self.collection_size = kwargs.get('collection_size', -1)
+		self.hits = 0
+		self.misses = 0
+		self.compiles = 0
+		self.compile_time = 0.0
+		self.module_loads = 0 # templates loaded from a cached compiled module
+		self.module_load_time = 0.0
+
+	@staticmethod
+	def normalize_uri(uri):
+		return uri if uri.startswith('/') else '/' + uri
+
+	def get_template(self, uri):
+		uri = self.normalize_uri(uri)
+		if uri in self._collection:
+			self.hits += 1
+		else:
+			self.misses += 1
+		return super().get_template(uri)
+
+	def _load(self, filename, uri):
+		if self.module_cache is None:
+			return self._load_timed(filename, uri)
+		# serialise compiles of the same template across lookups and threads
+		with self.module_cache.template_lock(filename):
+			return self._load_timed(filename, uri)
+
+	def _load_timed(self, filename, uri):
+		if uri in self._collection: # loaded by another thread while waiting
+			return super()._load(filename, uri)
+		if not self.module_cache is None:
+			self.module_cache.local.compiled = False
+		start = time.perf_counter()
+		template = super()._load(filename, uri)
+		elapsed = time.perf_counter() - start
+		if self.module_cache is None or self.module_cache.local.compiled:
+			self.compiles += 1
+			self.compile_time += elapsed
+		else:
+			self.module_loads += 1
+			self.module_load_time += elapsed
+		return template
+
+	def invalidate(self, uri=None):
+		with self._mutex:
+			if uri is None:
+				self._collection.clear()
+				self._uri_cache.clear()
+			else:
+				self._collection.pop(self.normalize_uri(uri), None)
+
+	def loaded_template(self, uri):
+		# the compiled template if currently loaded, without loading or checking the filesystem
+		try:
+			return self._collection[self.normalize_uri(uri)]
+		except KeyError:
+			return None
+
+	@property
+	def stats(self):
+		return {
+		 'hits': self.hits,
+		 'misses': self.misses,
+		 'compiles': self.compiles,
+		 'compile_time': self.compile_time,
+		 'module_loads': self.module_loads,
+		 'module_load_time': self.module_load_time,
+		 'size': len(self._collection),
+		 'max_size': self.collection_size,
+		}
+
+
 class WKAppTemplate(bottle.MakoTemplate):
+	# deprecated, views render through WKApp.template and the app's shared WKViewsLookup.
+	# Kept as a bottle template adapter loading through a WKViewsLookup, the one passed as
+	# 'template_lookup' or one created from the template settings
 
 	def prepare(self, **options):
 		from mako.template import Template
-		from mako.lookup import TemplateLookup
+		warnings.warn('WKAppTemplate is deprecated, use WKApp.template', DeprecationWarning, stacklevel=3)
 		options.update({'input_encoding': self.encoding})
 		options.setdefault('format_exceptions', bool(bottle.DEBUG))
-		lookup = options.pop('template_lookup', None) # threading can cause problems here
+		module_cache = options.pop('module_cache', None)
+		lookup = options.pop('template_lookup', None)
+		directories = options.pop('directories', self.lookup)
 		if lookup is None:
-			directories = options.pop('directories', self.lookup)
-			lookup = TemplateLookup(directories=directories, **options)
+			lookup = WKViewsLookup(directories=directories, module_cache=module_cache, **options)
 		if self.source:
 			self.tpl = Template(self.source, lookup=lookup, **options)
 		else:
-			self.tpl = Template(uri=self.name,
-			                    filename=self.filename,
-			                    lookup=lookup,
-			                    **options)
+			self.tpl = lookup.get_template(self.name)
+
+
+def wkapp_template(*args, **kwargs):
+	# deprecated, use WKApp.template
+	warnings.warn('wkapp_template is deprecated, use WKApp.template', DeprecationWarning, stacklevel=2)
+	kwargs['template_adapter'] = WKAppTemplate
+	return bottle.template(*args, **kwargs)
+
+
+def template(*args, **kwargs):
+	# deprecated, formerly bottle.mako_template imported as template, use WKApp.template
+	warnings.warn('WKApp.template() at module level is deprecated, use the WKApp.template method',
+	              DeprecationWarning, stacklevel=2)
+	return bottle.mako_template(*args, **kwargs)
+
+
+class WKViewsCache:
+	# LRU cache of view instances with an optional idle ttl, views reported as pinned are never evicted
+	# evicted views are passed to the evicted callback outside the lock
+
+	def __init__(self, max_size=64, ttl=None, pinned=None, evicted=None):
+		self.max_size = max_size
+		self.ttl = ttl
+		self.pinned = pinned if not pinned is None else lambda view: False
+		self.evicted = evicted if not evicted is None else lambda key, view, reason: None
+		self.views = collections.OrderedDict()
+		self.accessed = {} # key -> [last access time, hits]
+		self.lock = threading.RLock()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.expirations = 0
+
+	def __contains__(self, key):
+		return key in self.views
+
+	def __len__(self):
+		return len(self.views)
+
+	def keys(self):
+		with self.lock:
+			return list(self.views)
+
+	def __getitem__(self, key):
+		view = self.get(key)
+		if view is None:
+			raise KeyError(key)
+		return view
+
+	def __setitem__(self, key, view):
+		self.put(key, view)
+
+	def expired(self, key, now):
+		return not self.ttl is None and now - self.accessed[key][0] > self.ttl
+
+	def get(self, key, default=None):
+		evicted = []
+		with self.lock:
+			view = self.views.get(key, None)
+			if not view is None and self.expired(key, time.monotonic()) and not self.pinned(view):
+				evicted.append(self.remove(key, 'expired'))
+				view = None
+			if view is None:
+				self.misses += 1
+			else:
+				self.hits += 1
+				self.views.move_to_end(key)
+				accessed = self.accessed[key]
+				accessed[0] = time.monotonic()
+				accessed[1] += 1
+		self.notify(evicted)
+		return view if not view is None else default
+
+	def peek(self, key):
+		# lookup without counting, reordering or expiring
+		return self.views.get(key, None)
+
+	def put(self, key, view):
+		with self.lock:
+			self.views[key] = view
+			self.views.move_to_end(key)
+			self.accessed[key] = [time.monotonic(), 0]
+			evicted = self.collect()
+		self.notify(evicted)
+		return view
+
+	def pop(self, key, default=None):
+		# removes without eviction callbacks, used for invalidation
+		with self.lock:
+			self.accessed.pop(key, None)
+			return self.views.pop(key, default)
+
+	def remove(self, key, reason):
+		view = self.views.pop(key)
+		del self.accessed[key]
+		if reason == 'expired':
+			self.expirations += 1
+		else:
+			self.evictions += 1
+		return key, view, reason
+
+	def collect(self):
+		evicted = []
+		now = time.monotonic()
+		if not self.ttl is None:
+			for key in [key for key in self.views if self.expired(key, now)]:
+				if not self.pinned(self.views[key]):
+					evicted.append(self.remove(key, 'expired'))
+		if not self.max_size is None and self.max_size > 0:
+			excess = len(self.views) - self.max_size
+			for key in list(self.views):
+				if excess <= 0:
+					break
+				if not self.pinned(self.views[key]):
+					evicted.append(self.remove(key, 'evicted'))
+					excess -= 1
+		return evicted
+
+	def sweep(self):
+		# evicts expired and excess views now rather than on the next insert
+		with self.lock:
+			evicted = self.collect()
+		self.notify(evicted)
+		return len(evicted)
+
+	def notify(self, evicted):
+		for key, view, reason in evicted:
+			try:
+				self.evicted(key, view, reason)
+			except Exception as e:
+				log.warning(f'WKViewsCache - Evicted callback failed for {key} {e}')
+
+	@staticmethod
+	def view_size(view):
+		# shallow estimate of the memory held by a view and its own attribute values
+		size = sys.getsizeof(view)
+		attrs = getattr(view, '__dict__', None)
+		if not attrs is None:
+			size += sys.getsizeof(attrs)
+			size += sum(sys.getsizeof(value) for value in attrs.values())
+		return size
+
+	@property
+	def stats(self):
+		now = time.monotonic()
+		with self.lock:
+			views = {
+			 key: {
+			  'bytes': self.view_size(view),
+			  'idle': now - self.accessed[key][0],
+			  'hits': self.accessed[key][1],
+			  'pinned': self.pinned(view),
+			 }
+			 for key, view in self.views.items()
+			}
+		return {
+		 'hits': self.hits,
+		 'misses': self.misses,
+		 'evictions': self.evictions,
+		 'expirations': self.expirations,
+		 'size': len(views),
+		 'max_size': self.max_size,
+		 'ttl': self.ttl,
+		 'bytes': sum(view['bytes'] for view in views.values()),
+		 'views': views,
+		}
 
-wkapp_template = functools.partial(bottle.template, template_adapter=WKAppTemplate)
 
 class WKViews:
 
 	def __init__(self, app, app_path, app_views_path, module_path,
-	             module_views_path):
+	             module_views_path, views_cache=True, views_cache_size=256,
+	             filesystem_checks=True, views_slots=False, views_max=64, views_ttl=None,
+	             view_key=None, debug=False):
 		bottle.TEMPLATE_PATH.clear()
 		bottle.TEMPLATE_PATH.append(app_views_path)
 		bottle.TEMPLATE_PATH.append(module_views_path)
 		imports = []
+		self.module_cache = None
+		if views_cache:
+			self.module_cache = WKViewsModuleCache(os.path.join(app_path, 'views-cache'))
 		self.template_settings = {
 		 'directories': bottle.TEMPLATE_PATH,
-		 #'module_directory': os.path.join(app_path, 'views-cache'),
+		 'module_cache': self.module_cache,
 		 'imports': imports,
 		 'preprocessor': WKViewsLexer.preprocessor,
 		 'lexer_cls': WKViewsLexer
 		}
-		self.lookup = TemplateLookup(**self.template_settings)
+		# one lookup shared by template rendering and view resolution, template errors are
+		# rendered as an html traceback page in debug mode only
+		self.lookup = WKViewsLookup(input_encoding='utf-8',
+		                            format_exceptions=debug,
+		                            collection_size=views_cache_size,
+		                            filesystem_checks=filesystem_checks,
+		                            **self.template_settings)
 		self.app = app
 		self.load_view = None
 		self.next_view = None
-		self.views = {}
+		self.views = WKViewsCache(views_max, views_ttl, pinned=self.pinned, evicted=self.evicted)
+		self.views_lock = threading.RLock()
+		# state returned by on_evict, handed to on_restore when the view is created again
+		self.evicted_states = collections.OrderedDict()
+		self.evicted_states_size = 1024
+		self.url_keys = {}
+		self.url_keys_size = 1024
+		self.view_key_default = view_key
+		self.views_slots = views_slots
+		self.view_types = {}
 		self.view = WKView()
-		self.views[self.view.url] = self.view
-		self.about_blank_view = WKView('about:blank')
-		self.views[self.about_blank_view.url] = self.about_blank_view
+		self.about_blank_view = WKView(url='about:blank')
+
+	def pinned(self, view):
+		return view is self.view or view is self.load_view or view is self.next_view
+
+	def evicted(self, key, view, reason):
+		log.warning(f'WKViewState - View {reason} {key}')
+		state = view.event('on_evict')
+		with self.views_lock:
+			self.evicted_states[key] = state
+			self.evicted_states.move_to_end(key)
+			while len(self.evicted_states) > self.evicted_states_size:
+				self.evicted_states.popitem(last=False)
 
 	def template(self, path, **kwargs):
-		return wkapp_template(path, template_settings=self.template_settings, **kwargs)
+		try:
+			view_template = self.lookup.get_template(path)
+		except TopLevelLookupException:
+			raise bottle.HTTPError(404, f'Template not found: {path}')
+		kwargs.setdefault('static_url', self.app.static_url)
+		return view_template.render(**kwargs)
+
+	def invalidate(self, path=None):
+		with self.views_lock:
+			self.invalidate_view_types(path)
+			self.lookup.invalidate(path)
+
+	def invalidate_view_types(self, path=None):
+		# drops the view types created from the current module of a template, all types if no path given
+		if path is None:
+			self.view_types.clear()
+			return
+		view_template = self.lookup.loaded_template(path)
+		if view_template is None:
+			return
+		for key in [key for key in self.view_types if key[0] is view_template.module]:
+			del self.view_types[key]
 
 	@property
 	def base_url(self):
-		return self.app.base_url
+		# views are addressed by the url the webview navigates to, wkapp:// in custom scheme mode,
+		# so views created from a path (e.g. by warmup) match the urls later loaded
+		return self.app.app_url.rstrip('/')
 
 	@property
 	def url(self):
@@ -417,39 +1653,242 @@ class WKViews:
 			url = self.base_url + path
 		return url, path
 
+	def view_key_spec(self, path):
+		try:
+			view_template = self.lookup.get_template(path)
+		except Exception:
+			return self.view_key_default
+		view_class = getattr(view_template.module, 'view_class', None)
+		spec = getattr(view_class, 'view_key', None)
+		return spec if not spec is None else self.view_key_default
+
+	def view_key(self, url, path):
+		# the views cache key, path optionally followed by '?' and a qualifier from the query
+		spec = self.view_key_spec(path)
+		if spec is None:
+			return path
+		query = parse_qsl(urlparse(url).query, keep_blank_values=True)
+		if callable(spec):
+			qualifier = spec(path, dict(query))
+		else:
+			qualifier = '&'.join(f'{urlencode(name)}={urlencode(value)}'
+			                     for name in spec for k, value in query if k == name)
+		return path + '?' + qualifier if qualifier else path
+
+	@staticmethod
+	def key_path(key):
+		return key.split('?', 1)[0]
+
 	def get_view(self, url=None, path=None, create=False):
-		view = None
+		return self.resolve_view(url, path, create)[0]
+
+	def resolve_view(self, url=None, path=None, create=False):
+		# returns the view and whether it was created by this call
+		request_url = url
 		url, path = self.get_url_path(url, path)
 		if url == 'about:blank':
+			return self.about_blank_view, False
+		# the root url normalises to /index.html, the key still comes from the requested query
+		key = self.view_key(request_url or url, path)
+		if create:
+			view = self.views.get(key, None)
+			if view is None:
+				with self.views_lock:
+					view = self.views.peek(key)
+					if view is None:
+						view = self.create_view(url, path)
+						restore = key in self.evicted_states
+						state = self.evicted_states.pop(key, None)
+						self.views[key] = view
+						if restore:
+							view.event('on_restore', state)
+						return view, True
+			return view, False
+		return self.views[key], False
+
+	def create_view(self, url, path):
+		view_template = None
+		try:
+			view_template = self.lookup.get_template(path)
+			if view_template is None:
+				raise Exception("Mako template not found.")
+			log.warning(f'WKViewState - Template found for {path} {view_template}')
+		except Exception as e:
+			log.warning(
+			 f'WKViewState - No template found for path {path} {view_template}, {e}')
+		module = view_template.module if not view_template is None else None
+		view_class = getattr(module, 'view_class', None)
+		view = self.view_type(module, view_class)(self.app, url, path, view_template)
+		if view is None:
+			raise Exception(
+			 f"view_class is defined but returned None or not an object value = '{view}'"
+			)
+		return view
+
+	def view_type(self, module, view_class):
+		# the view_class_mixin type for a template module, created once until the template is reloaded
+		key = (module, view_class)
+		view_type = self.view_types.get(key, None)
+		if view_type is None:
+			with self.views_lock:
+				view_type = self.view_types.get(key, None)
+				if view_type is None:
+					view_type = self.create_view_type(view_class)
+					WKInvokeTable.of(view_type, WKView)
+					self.view_types[key] = view_type
+		return view_type
+
+	def create_view_type(self, view_class):
+		if view_class is None:
+			if self.views_slots:
+				return WKView
+			class view_class_mixin(WKView):
+				pass
+			return view_class_mixin
+		if self.views_slots and self.slots_compatible(view_class):
+			# instances without __dict__, the view class namespace is copied onto a WKView subclass
+			# with the attributes it declares in view_slots
+			namespace = {
+			 k: v
+			 for k, v in view_class.__dict__.items() if not k in ('__dict__', '__weakref__')
+			}
+			namespace['__slots__'] = tuple(view_class.view_slots)
+			return type('view_class_mixin', (WKView,), namespace)
+
+		class view_class_mixin(view_class, WKView):
+			pass
+
+		return view_class_mixin
+
+	@staticmethod
+	def slots_compatible(view_class):
+		# view_slots must be declared, the class must derive from object only and not use zero argument super()
+		if not 'view_slots' in view_class.__dict__ or view_class.__bases__ != (object,):
+			return False
+		for value in view_class.__dict__.values():
+			func = getattr(value, '__func__', value)
+			code = getattr(func, '__code__', None)
+			if not code is None and '__class__' in code.co_freevars:
+				return False
+		return True
+
+	def find_view(self, url):
+		# resolves an existing view from a webview url, the url -> key index skips reparsing known urls
+		key = self.url_keys.get(url, None)
+		if not key is None:
+			view = self.views.get(key, None)
+			if not view is None:
+				return view
+		url_, path = self.get_url_path(url=url)
+		if url_ == 'about:blank':
 			return self.about_blank_view
-		if create and not path in self.views:
+		key = self.view_key(url, path)
+		view = self.views[key]
+		if len(self.url_keys) >= self.url_keys_size:
+			self.url_keys.clear()
+		self.url_keys[url] = key
+		return view
+
+	def template_paths(self):
+		# every .html template uri under the lookup directories, earlier directories take precedence
+		paths = []
+		for directory in self.lookup.directories:
+			if not os.path.isdir(directory):
+				continue
+			for root, dirs, files in os.walk(directory):
+				dirs[:] = [d for d in dirs if not is_excluded_dir(d)]
+				for name in files:
+					if not name.endswith('.html'):
+						continue
+					relpath = os.path.relpath(os.path.join(root, name), directory)
+					path = '/' + relpath.replace(os.path.sep, '/')
+					if not path in paths:
+						paths.append(path)
+		return paths
+
+	dependency_pattern = re.compile(
+	 r'<%(?:inherit|include|namespace)\b[^>]*?\bfile\s*=\s*["\']([^"\'$]+)["\']')
+
+	def template_filename(self, path):
+		for directory in self.lookup.directories:
+			filename = os.path.join(directory, *path.strip('/').split('/'))
+			if os.path.isfile(filename):
+				return filename
+		return None
+
+	def template_uris(self, filename):
+		uris = []
+		filename = os.path.abspath(filename)
+		for directory in self.lookup.directories:
+			directory = os.path.abspath(directory)
+			if filename.startswith(directory + os.path.sep):
+				uris.append('/' + os.path.relpath(filename, directory).replace(os.path.sep, '/'))
+		return uris
+
+	def template_dependents(self):
+		# maps a template uri to the uris of templates inheriting, including or importing it
+		dependents = {}
+		for path in self.template_paths():
+			filename = self.template_filename(path)
+			try:
+				with open(filename, 'r', encoding='utf-8') as template_file:
+					source = template_file.read()
+			except (OSError, TypeError, UnicodeDecodeError):
+				continue
+			for dependency in self.dependency_pattern.findall(source):
+				if not dependency.startswith('/'):
+					dependency = posixpath.join(posixpath.dirname(path), dependency)
+				dependency = posixpath.normpath(dependency)
+				dependents.setdefault(dependency, set()).add(path)
+		return dependents
+
+	def invalidate_files(self, filenames):
+		# invalidates compiled templates and cached views for changed files and everything depending on them
+		changed = set()
+		for filename in filenames:
+			changed.update(self.template_uris(filename))
+		if len(changed) == 0:
+			return changed
+		dependents = self.template_dependents()
+		affected = set()
+		pending = list(changed)
+		while pending:
+			uri = pending.pop()
+			if uri in affected:
+				continue
+			affected.add(uri)
+			pending.extend(dependents.get(uri, ()))
+		with self.views_lock:
+			for uri in affected:
+				self.invalidate_view_types(uri)
+				self.lookup.invalidate(uri)
+			# every instance of an affected template, whatever its key
+			for key in [key for key in self.views.keys() if self.key_path(key) in affected]:
+				self.views.pop(key, None)
+			for key in [key for key in self.evicted_states if self.key_path(key) in affected]:
+				del self.evicted_states[key]
+		return affected
+
+	def warmup(self, workers=4, instantiate=True):
+		# compiles every template and creates views for those defining a view_class. Views keyed by
+		# query parameters are only compiled, navigation would never reuse an instance without a key
+		def warm(path):
+			start = time.perf_counter()
 			try:
 				view_template = self.lookup.get_template(path)
-				if view_template is None:
-					raise Exception("Mako template not found.")
-				log.warning(f'WKViewState - Template found for {path} {view_template}')
+				if instantiate and hasattr(view_template.module, 'view_class') \
+				  and self.view_key_spec(path) is None:
+					self.get_view(path=path, create=True)
 			except Exception as e:
-				log.warning(
-				 f'WKViewState - No template found for path {path} {view_template}, {e}')
-			if not view_template is None and hasattr(view_template.module,
-			                                         'view_class'):
-				view_class = view_template.module.view_class
+				log.warning(f'WKViewState - Warmup failed for {path} {e}')
+				return path, None
+			return path, time.perf_counter() - start
 
-				class view_class_mixin(view_class, WKView):
-					pass
-
-				view = view_class_mixin(self.app, url, path, view_template)
-				if view is None:
-					raise Exception(
-					 f"view_class is defined but returned None or not an object value = '{view}'"
-					)
-			else:
-				view = WKView(self.app, url, path, view_template)
-			self.views[path] = view
-			return view
-		if not path is None:
-			view = self.views[path]
-		return view
+		timings = {}
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			for path, elapsed in executor.map(warm, self.template_paths()):
+				timings[path] = elapsed
+		return timings
 
 	def prepare_load_view(self, url, scheme, nav_type):
 		log.warning(f'WKViewState - Preparing load {url}')
@@ -479,6 +1918,575 @@ class WKViews:
 		view.event('on_loaded')
 
 
+class WKAppPageCache:
+	# rendered template output of views providing cache_key(), keyed by template path, view key and
+	# the version cache_key() returns, entries are bound to the template module they were rendered from
+
+	def __init__(self, max_entries=256, max_size=32 * 1024 * 1024):
+		self.max_entries = max_entries
+		self.max_size = max_size
+		self.entries = collections.OrderedDict() # key -> (module, etag, body, expires)
+		self.size = 0
+		self.lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.not_modified = 0
+
+	@staticmethod
+	def etag(body):
+		return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+	@staticmethod
+	def etag_matches(etag, if_none_match):
+		if not if_none_match:
+			return False
+		for candidate in if_none_match.split(','):
+			candidate = candidate.strip()
+			if candidate.startswith('W/'):
+				candidate = candidate[2:]
+			if candidate == '*' or candidate == etag:
+				return True
+		return False
+
+	def get(self, key, module):
+		with self.lock:
+			entry = self.entries.get(key, None)
+			if not entry is None:
+				if entry[0] is module and (entry[3] is None or entry[3] > time.monotonic()):
+					self.entries.move_to_end(key)
+					self.hits += 1
+					return entry[1], entry[2]
+				self.remove(key)
+			self.misses += 1
+			return None
+
+	def put(self, key, module, etag, body, ttl=None):
+		if len(body) > self.max_size:
+			return
+		expires = time.monotonic() + ttl if not ttl is None else None
+		with self.lock:
+			if key in self.entries:
+				self.remove(key)
+			self.entries[key] = (module, etag, body, expires)
+			self.size += len(body)
+			while len(self.entries) > self.max_entries or self.size > self.max_size:
+				self.remove(next(iter(self.entries)))
+
+	def remove(self, key):
+		entry = self.entries.pop(key)
+		self.size -= len(entry[2])
+
+	def invalidate(self, paths=None):
+		with self.lock:
+			for key in list(self.entries):
+				if paths is None or key[0] in paths:
+					self.remove(key)
+
+	@property
+	def stats(self):
+		return {
+		 'hits': self.hits,
+		 'misses': self.misses,
+		 'not_modified': self.not_modified,
+		 'entries': len(self.entries),
+		 'size': self.size,
+		 'max_size': self.max_size,
+		}
+
+
+class WKAppStatic:
+	# static files from an index of resolved paths built at startup, with precompressed .gz/.br
+	# sidecars, conditional and range requests, earlier roots take precedence. Search roots are
+	# looked up on every request ahead of the index without being walked (the app root)
+
+	class Entry:
+
+		__slots__ = ('path', 'size', 'mtime', 'etag', 'content_type', 'variants')
+
+		def __init__(self, path, stat):
+			self.path = path
+			self.size = stat.st_size
+			self.mtime = stat.st_mtime
+			self.etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+			self.content_type = WKAppStatic.content_type(path)
+			self.variants = {} # encoding -> (path, size)
+
+	compressible = ('text/', 'application/javascript', 'application/json', 'application/wasm',
+	                'application/xml', 'image/svg+xml')
+	compress_min_size = 1024
+	# name.<hash>.ext, served as immutable
+	hashed_pattern = re.compile(r'\.[0-9a-f]{8,}\.[^./]+$')
+	immutable = 'public, max-age=31536000, immutable'
+	encodings = {'br': '.br', 'gzip': '.gz'}
+	chunk_size = 64 * 1024
+
+	def __init__(self, roots, cache_path=None, search_roots=()):
+		self.roots = [os.path.abspath(root) for root in roots]
+		self.search_roots = [os.path.abspath(root) for root in search_roots]
+		self.cache_path = cache_path
+		self.index = {}
+		self.lock = threading.Lock()
+		# fingerprinted names, relpath -> name.<hash>.ext and back
+		self.manifest = {}
+		self.hashed = {}
+		self.manifest_path = os.path.join(cache_path, 'manifest.json') if not cache_path is None else None
+		self.digests = {} # relpath -> (etag, digest) from the previous manifest
+		self.requests = 0
+		self.fingerprinted = 0
+		self.compressors = {'gzip': lambda data: gzip.compress(data, 9)}
+		if not brotli is None:
+			self.compressors['br'] = lambda data: brotli.compress(data)
+		self.served = 0
+		self.not_modified = 0
+		self.ranges = 0
+		self.compressed = 0
+
+	@staticmethod
+	def content_type(path):
+		if path.endswith('.wasm'):
+			return 'application/wasm'
+		content_type, encoding = mimetypes.guess_type(path)
+		if content_type is None:
+			return 'application/octet-stream'
+		if content_type.startswith('text/') or content_type == 'application/javascript':
+			content_type += '; charset=UTF-8'
+		return content_type
+
+	@staticmethod
+	def normalize(filepath):
+		# relative posix path without traversal out of the roots
+		return posixpath.normpath('/' + filepath.replace('\\', '/')).lstrip('/')
+
+	@staticmethod
+	def is_excluded(relpath):
+		return any(is_excluded_dir(name) for name in relpath.split('/')[:-1])
+
+	def build(self):
+		index = {}
+		for root in reversed(self.roots):
+			if not os.path.isdir(root):
+				continue
+			for dirpath, dirs, files in os.walk(root):
+				dirs[:] = [d for d in dirs if not is_excluded_dir(d)]
+				for name in files:
+					path = os.path.join(dirpath, name)
+					relpath = os.path.relpath(path, root).replace(os.path.sep, '/')
+					try:
+						index[relpath] = self.Entry(path, os.stat(path))
+					except OSError:
+						continue
+		for relpath, entry in index.items():
+			self.attach_variants(entry, index.get(relpath + '.br', None), index.get(relpath + '.gz', None))
+		with self.lock:
+			self.index = index
+		self.load_manifest()
+		return len(index)
+
+	def load_manifest(self):
+		# digests are reused for files whose etag has not changed since the manifest was written
+		if self.manifest_path is None:
+			return
+		try:
+			with open(self.manifest_path, 'r', encoding='utf-8') as manifest_file:
+				manifest = json.load(manifest_file)
+		except (OSError, ValueError):
+			return
+		self.digests = {
+		 relpath: (item['etag'], item['hash'])
+		 for relpath, item in manifest.get('files', {}).items()
+		}
+
+	def save_manifest(self):
+		if self.manifest_path is None:
+			return
+		with self.lock:
+			files = {
+			 relpath: {'etag': self.digests[relpath][0], 'hash': self.digests[relpath][1], 'url': name}
+			 for relpath, name in self.manifest.items() if relpath in self.digests
+			}
+		os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+		fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.manifest_path))
+		with os.fdopen(fd, 'w', encoding='utf-8') as manifest_file:
+			json.dump({'version': 1, 'files': files}, manifest_file, indent=1, sort_keys=True)
+		os.replace(tmp_path, self.manifest_path)
+
+	def digest(self, relpath, entry):
+		previous = self.digests.get(relpath, None)
+		if not previous is None and previous[0] == entry.etag:
+			return previous[1]
+		content_hash = hashlib.sha256()
+		with open(entry.path, 'rb') as file:
+			for data in iter(lambda: file.read(self.chunk_size), b''):
+				content_hash.update(data)
+		digest = content_hash.hexdigest()[:12]
+		with self.lock:
+			self.digests[relpath] = (entry.etag, digest)
+		return digest
+
+	def hashed_name(self, filepath):
+		# name.<content hash>.ext for a static file, the path unchanged if there is no such file
+		relpath = self.normalize(filepath)
+		name = self.manifest.get(relpath, None)
+		if not name is None:
+			return name
+		entry = self.lookup(relpath)
+		if entry is None:
+			return relpath
+		base, ext = posixpath.splitext(relpath)
+		name = f'{base}.{self.digest(relpath, entry)}{ext}'
+		with self.lock:
+			self.manifest[relpath] = name
+			self.hashed[name] = relpath
+		return name
+
+	def fingerprint(self):
+		# fingerprints every file and writes the manifest, returns the number of files
+		for relpath, entry in list(self.index.items()):
+			base, ext = posixpath.splitext(relpath)
+			if ext in ('.br', '.gz') and base in self.index:
+				continue
+			self.hashed_name(relpath)
+		self.save_manifest()
+		return len(self.manifest)
+
+	def search(self, relpath):
+		# entry of a file under the search roots, not kept in the index
+		if self.is_excluded(relpath):
+			return None
+		for root in self.search_roots:
+			path = os.path.join(root, *relpath.split('/'))
+			if os.path.isfile(path):
+				entry = self.Entry(path, os.stat(path))
+				self.attach_variants(entry)
+				return entry
+		return None
+
+	def resolve(self, filepath):
+		# (relpath, entry, immutable) for a requested path, fingerprinted names resolve to their file
+		relpath = self.normalize(filepath)
+		entry = self.search(relpath) if self.search_roots else None
+		if not entry is None:
+			return relpath, entry, False
+		original = self.hashed.get(relpath, None)
+		if not original is None:
+			return original, self.lookup(original), True
+		entry = self.lookup(relpath)
+		if not entry is None:
+			return relpath, entry, not self.hashed_pattern.search(relpath) is None
+		match = self.hashed_pattern.search(relpath)
+		if not match is None:
+			# a fingerprint from before the file changed, serve the current file revalidated
+			stripped = relpath[:match.start()] + posixpath.splitext(relpath)[1]
+			return stripped, self.lookup(stripped), False
+		return relpath, None, False
+
+	def attach_variants(self, entry, br=None, gz=None):
+		# sidecars next to the file or generated into the cache directory, if not older than the file
+		for encoding, sidecar in (('br', br), ('gzip', gz)):
+			if not sidecar is None and sidecar.mtime >= entry.mtime:
+				entry.variants[encoding] = (sidecar.path, sidecar.size)
+				continue
+			path = self.sidecar_path(entry, encoding)
+			if not path is None and os.path.isfile(path):
+				entry.variants[encoding] = (path, os.path.getsize(path))
+
+	def lookup(self, filepath):
+		relpath = self.normalize(filepath)
+		entry = self.index.get(relpath, None)
+		if not entry is None:
+			return entry
+		# added after the index was built
+		if self.is_excluded(relpath):
+			return None
+		for root in self.roots:
+			path = os.path.join(root, *relpath.split('/'))
+			if os.path.isfile(path):
+				entry = self.Entry(path, os.stat(path))
+				self.attach_variants(entry)
+				with self.lock:
+					self.index[relpath] = entry
+				return entry
+		return None
+
+	def invalidate(self, filenames):
+		# changed files and the files of changed sidecars are looked up again on their next request,
+		# returns their relative paths
+		invalidated = set()
+		with self.lock:
+			for filename in filenames:
+				filename = os.path.abspath(filename)
+				for root in self.roots:
+					if not filename.startswith(root + os.path.sep):
+						continue
+					relpath = os.path.relpath(filename, root).replace(os.path.sep, '/')
+					base, ext = posixpath.splitext(relpath)
+					for changed in (relpath, base) if ext in ('.br', '.gz') else (relpath,):
+						self.index.pop(changed, None)
+						self.hashed.pop(self.manifest.pop(changed, None), None)
+						invalidated.add(changed)
+		return invalidated
+
+	def is_compressible(self, entry):
+		return entry.size >= self.compress_min_size and entry.content_type.startswith(self.compressible)
+
+	def sidecar_path(self, entry, encoding):
+		if self.cache_path is None:
+			return None
+		key = hashlib.sha1(f'{entry.path}|{entry.etag}'.encode('utf-8')).hexdigest()
+		return os.path.join(self.cache_path, key + self.encodings[encoding])
+
+	def precompress(self):
+		# writes missing sidecars for compressible entries, returns the number written
+		if self.cache_path is None:
+			return 0
+		os.makedirs(self.cache_path, exist_ok=True)
+		written = 0
+		for entry in list(self.index.values()):
+			if not self.is_compressible(entry):
+				continue
+			data = None
+			for encoding, compress in self.compressors.items():
+				if encoding in entry.variants:
+					continue
+				if data is None:
+					with open(entry.path, 'rb') as file:
+						data = file.read()
+				compressed = compress(data)
+				if len(compressed) >= entry.size:
+					continue
+				path = self.sidecar_path(entry, encoding)
+				fd, tmp_path = tempfile.mkstemp(dir=self.cache_path)
+				with os.fdopen(fd, 'wb') as file:
+					file.write(compressed)
+				os.replace(tmp_path, path)
+				entry.variants[encoding] = (path, len(compressed))
+				written += 1
+		return written
+
+	@staticmethod
+	def accepted_encodings(accept_encoding):
+		# encodings in order of preference, those with q=0 left out
+		accepted = []
+		for item in (accept_encoding or '').split(','):
+			name, _, params = item.strip().partition(';')
+			q = 1.0
+			params = params.strip()
+			if params.startswith('q='):
+				try:
+					q = float(params[2:])
+				except ValueError:
+					q = 0.0
+			if name and q > 0:
+				accepted.append((q, name.strip().lower()))
+		accepted.sort(key=lambda item: -item[0])
+		return [name for q, name in accepted]
+
+	def negotiate(self, entry, accept_encoding):
+		accepted = self.accepted_encodings(accept_encoding)
+		for encoding in self.encodings:
+			if encoding in entry.variants and (encoding in accepted or '*' in accepted):
+				return encoding
+		return None
+
+	@staticmethod
+	def parse_range(value, size):
+		# (start, end) inclusive of a single byte range, None for unsatisfiable, False if not usable
+		if not value or not value.startswith('bytes=') or ',' in value:
+			return False
+		start, _, end = value[6:].strip().partition('-')
+		try:
+			if start == '':
+				length = int(end)
+				if length <= 0:
+					return None
+				return max(0, size - length), size - 1
+			start = int(start)
+			end = int(end) if end else size - 1
+		except ValueError:
+			return False
+		if start >= size or end < start:
+			return None
+		return start, min(end, size - 1)
+
+	def read_range(self, file, offset, length):
+		try:
+			while length > 0:
+				data = os.pread(file.fileno(), min(self.chunk_size, length), offset)
+				if not data:
+					break
+				offset += len(data)
+				length -= len(data)
+				yield data
+		finally:
+			file.close()
+
+	def serve(self, filepath):
+		relpath, entry, immutable = self.resolve(filepath)
+		if entry is None:
+			return bottle.HTTPError(404, 'File does not exist.')
+		self.requests += 1
+		headers = {
+		 'Content-Type': entry.content_type,
+		 'Accept-Ranges': 'bytes',
+		 'Vary': 'Accept-Encoding',
+		}
+		if immutable:
+			headers['Cache-Control'] = self.immutable
+			self.fingerprinted += 1
+		else:
+			headers['Cache-Control'] = 'no-cache'
+		range_header = request.environ.get('HTTP_RANGE', None)
+		encoding = None
+		if range_header is None and self.is_compressible(entry):
+			encoding = self.negotiate(entry, request.environ.get('HTTP_ACCEPT_ENCODING', ''))
+		path, size = entry.variants[encoding] if not encoding is None else (entry.path, entry.size)
+		try:
+			file = open(path, 'rb')
+		except OSError:
+			# removed since it was indexed
+			with self.lock:
+				if self.index.get(relpath, None) is entry:
+					self.index.pop(relpath, None)
+			return bottle.HTTPError(404, 'File does not exist.')
+		if encoding is None:
+			stat = os.fstat(file.fileno())
+			if self.index.get(relpath, None) is entry and (stat.st_size != entry.size or
+			                                                 stat.st_mtime != entry.mtime):
+				# changed without a reload, refresh the entry from the open file
+				entry = self.Entry(path, stat)
+				with self.lock:
+					self.index[relpath] = entry
+					self.hashed.pop(self.manifest.pop(relpath, None), None)
+				size = entry.size
+		else:
+			headers['Content-Encoding'] = encoding
+			self.compressed += 1
+		headers['ETag'] = entry.etag if encoding is None else entry.etag[:-1] + '-' + encoding + '"'
+		headers['Last-Modified'] = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(entry.mtime))
+		if WKAppPageCache.etag_matches(headers['ETag'], request.environ.get('HTTP_IF_NONE_MATCH', None)):
+			file.close()
+			self.not_modified += 1
+			return bottle.HTTPResponse(status=304, **headers)
+		self.served += 1
+		if request.method == 'HEAD':
+			file.close()
+			headers['Content-Length'] = size
+			return bottle.HTTPResponse('', **headers)
+		byte_range = self.parse_range(range_header, size) if not range_header is None else False
+		if byte_range is None:
+			file.close()
+			headers['Content-Range'] = f'bytes */{size}'
+			return bottle.HTTPResponse('', status=416, **headers)
+		if byte_range:
+			self.ranges += 1
+			start, end = byte_range
+			headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+			headers['Content-Length'] = end - start + 1
+			return bottle.HTTPResponse(self.read_range(file, start, end - start + 1), status=206, **headers)
+		headers['Content-Length'] = size
+		# bottle hands file objects to wsgi.file_wrapper when the server provides one (sendfile)
+		return bottle.HTTPResponse(file, **headers)
+
+	@property
+	def stats(self):
+		return {
+		 'files': len(self.index),
+		 'served': self.served,
+		 'not_modified': self.not_modified,
+		 'ranges': self.ranges,
+		 'compressed': self.compressed,
+		 'encodings': list(self.compressors),
+		 'manifest': len(self.manifest),
+		 'requests': self.requests,
+		 'fingerprinted': self.fingerprinted,
+		 # share of static requests for fingerprinted urls, answered as immutable. Requests the
+		 # webview answers from its own cache never reach the app and cannot be counted
+		 'immutable_rate': self.fingerprinted / self.requests if self.requests else None,
+		}
+
+
+class WKAppStaticArena:
+	# static files preloaded into one anonymous mmap with an offset index, so custom scheme
+	# tasks are answered from memory without the http stack. The mmap lives as long as the
+	# arena since webkit is handed views into it without copying. Changed files leave the index
+	# and are served from disk, their bytes stay in the arena until it is released.
+
+	def __init__(self, static, max_size=64 * 1024 * 1024, max_file_size=4 * 1024 * 1024):
+		self.static = static
+		self.max_size = max_size
+		self.max_file_size = max_file_size
+		self.arena = None
+		self.index = {} # relpath -> (offset, size, entry)
+		self.size = 0
+		self.hits = 0
+		self.bypassed = 0
+
+	def load(self):
+		# preloads files up to max_file_size each, smallest first, until max_size is reached
+		selected = []
+		size = 0
+		bypassed = 0
+		for relpath, entry in sorted(self.static.index.items(), key=lambda item: item[1].size):
+			base, ext = posixpath.splitext(relpath)
+			if ext in ('.br', '.gz') and base in self.static.index:
+				continue
+			if entry.size == 0: # nothing to preload, served from disk
+				continue
+			if entry.size > self.max_file_size or size + entry.size > self.max_size:
+				bypassed += 1
+				continue
+			selected.append((relpath, entry))
+			size += entry.size
+		if size == 0:
+			return 0
+		arena = mmap.mmap(-1, size)
+		view = memoryview(arena)
+		index = {}
+		offset = 0
+		for relpath, entry in selected:
+			try:
+				with open(entry.path, 'rb') as file:
+					read = file.readinto(view[offset:offset + entry.size])
+			except OSError:
+				continue
+			if read != entry.size:
+				continue
+			index[relpath] = (offset, entry.size, entry)
+			offset += entry.size
+		self.arena = view
+		self.index = index
+		self.size = offset
+		self.bypassed = bypassed
+		return len(index)
+
+	def get(self, relpath):
+		# (entry, memoryview) of a preloaded file that has not changed since, or None
+		item = self.index.get(relpath, None)
+		if item is None:
+			return None
+		offset, size, entry = item
+		if not self.static.index.get(relpath, None) is entry:
+			self.index.pop(relpath, None)
+			return None
+		self.hits += 1
+		return entry, self.arena[offset:offset + size]
+
+	def discard(self, relpaths):
+		for relpath in relpaths:
+			self.index.pop(relpath, None)
+
+	@property
+	def stats(self):
+		return {
+		 'files': len(self.index),
+		 'size': self.size,
+		 'max_size': self.max_size,
+		 'max_file_size': self.max_file_size,
+		 'hits': self.hits,
+		 'bypassed': self.bypassed,
+		}
+
+
 class WKAppPlugin:
 
 	def __init__(self, app):
@@ -524,19 +2532,97 @@ class WKAppPlugin:
 		return wrapper
 
 
+class WKAppCalls:
+
+	def __init__(self, timeout=30.0):
+		self.timeout = timeout
+		self.results = []
+		self.lock = threading.Lock()
+		self.scheduled = False
+		self.calls = 0
+		self.errors = 0
+		self.flushes = 0
+
+	def resolve(self, webview, id, value=None, error=None):
+		if error is None:
+			result = [id, True, value]
+		else:
+			self.errors += 1
+			result = [id, False, f'{type(error).__name__}: {error}']
+		schedule = False
+		with self.lock:
+			self.calls += 1
+			self.results.append(result)
+			# without a webview the result waits for the next flush, scheduled is only set when one
+			# is dispatched so a later resolve with a webview still delivers it
+			if not self.scheduled and not webview is None:
+				self.scheduled = schedule = True
+		if schedule:
+			# queued behind pending script messages so results completing together share one eval_js
+			webview.dispatcher.dispatch_priority(WKWebView._webviewDispatcher.PRIORITY_MESSAGE,
+			                                     self.flush, webview)
+
+	def resolve_future(self, webview, id, future):
+		if future.cancelled():
+			self.resolve(webview, id, error=Exception('Call cancelled'))
+		elif not future.exception() is None:
+			self.resolve(webview, id, error=future.exception())
+		else:
+			self.resolve(webview, id, future.result())
+
+	def flush(self, webview):
+		with self.lock:
+			results = self.results
+			self.results = []
+			self.scheduled = False
+		if len(results) == 0:
+			return
+		self.flushes += 1
+		webview.eval_js_async(f'app.resolveCalls({json.dumps(results, default=str)});')
+
+
 class WKApp:
 
+	# methods javascript may invoke on the app, public methods of WKApp subclasses are invokable by default
+	invokable = ('exit',)
+
 	def __init__(self,
 	             root=None,
 	             port=8080,
 	             host='localhost',
 	             app=None,
 	             server=None,
+	             server_backend='threaded',
+	             server_workers=16,
+	             server_timeout=10.0,
+	             port_fallback=True,
+	             debug=False,
 	             app_views_path='views',
 	             app_static_path='static',
 	             module_views_path='views',
 	             module_static_path='static',
 	             custom_scheme = False,
+	             scheme_wsgi = True,
+	             scheme_workers = 4,
+	             proxy_cache = True,
+	             proxy_cache_size = 256 * 1024 * 1024,
+	             offline = False,
+	             views_cache = True,
+	             views_cache_size = 256,
+	             views_slots = False,
+	             views_max = 64,
+	             views_ttl = None,
+	             view_key = None,
+	             page_cache = False,
+	             static_index = True,
+	             static_precompress = True,
+	             static_arena = False,
+	             static_arena_size = 64 * 1024 * 1024,
+	             static_arena_file_size = 4 * 1024 * 1024,
+	             warm_views = False,
+	             hot_reload = False,
+	             hot_reload_push = True,
+	             use_asyncio = False,
 	             no_cache = True,
 	             clear_cache = False):
 		self.module_path = os.path.dirname(__file__)
@@ -551,6 +2637,40 @@ class WKApp:
 		self.app_static_path = os.path.join(self.app_path, app_static_path)
 		self.app_views_path = os.path.join(self.app_path, app_views_path)
 		self.custom_scheme = custom_scheme
+		self.warm_views = warm_views
+		self.warmup_thread = None
+		self.hot_reload = hot_reload
+		self.hot_reload_push = hot_reload_push
+		self.watcher = None
+		self.use_asyncio = use_asyncio
+		self.calls = WKAppCalls()
+		self._event_loop = None
+		self._event_loop_lock = threading.Lock()
+		self._coroutine_executor = None
+		self.scheme_wsgi = scheme_wsgi
+		self.scheme_chunk_size = 64 * 1024
+		self.scheme_workers = scheme_workers
+		self.proxy_timeout = (5.0, 30.0) # connect, read
+		self.proxy_retries = 2
+		self._session = None
+		self._session_lock = threading.Lock()
+		self.proxy_cache = None
+		if proxy_cache:
+			self.proxy_cache = WKAppProxyCache(os.path.join(self.app_path, 'proxy-cache'),
+			                                   max_size=proxy_cache_size,
+			                                   offline=offline)
+		self.page_cache = WKAppPageCache() if page_cache else None
+		self.static = None
+		self.static_precompress = static_precompress
+		self.static_thread = None
+		if static_index:
+			self.static = WKAppStatic([self.app_static_path, self.module_static_path],
+			                          os.path.join(self.app_path, 'static-cache'),
+			                          search_roots=[self.app_path])
+			self.static.build()
+		self.static_arena = None
+		if static_arena and not self.static is None:
+			self.static_arena = WKAppStaticArena(self.static, static_arena_size, static_arena_file_size)
 		self.no_cache = no_cache
 		self.clear_cache = clear_cache
 		if app is None:
@@ -561,11 +2681,28 @@ class WKApp:
 
 		self._app_view = None
 		self._views = WKViews(self, self.app_path, self.app_views_path,
-		                      self.module_path, self.module_views_path)
+		                      self.module_path, self.module_views_path,
+		                      views_cache=views_cache,
+		                      views_cache_size=views_cache_size,
+		                      filesystem_checks=not hot_reload,
+		                      views_slots=views_slots,
+		                      views_max=views_max,
+		                      views_ttl=views_ttl,
+		                      view_key=view_key,
+		                      debug=debug)
 		self.host = host
 		self.port = port
 		self.server = server
 		self.server_internal = self.server is None
+		self.server_backend = server_backend
+		self.server_workers = server_workers
+		self.server_timeout = server_timeout
+		self.server_drain_timeout = 5.0
+		self.port_fallback = port_fallback
+		self.debug = debug
+		# seconds since run() for launch milestones
+		self.startup = {}
+		self.startup_start = None
 		
 		self.plugin = WKAppPlugin(self)
 		self.app.install(self.plugin)
@@ -594,14 +2731,31 @@ class WKApp:
 			return f'wkapp://localhost/'
 		return self.base_url
 
+	@property
+	def server_required(self):
+		# wkapp://localhost/ is dispatched in-process when scheme_wsgi is set
+		return not (self.custom_scheme and self.scheme_wsgi)
+
 	def start_server(self):
+		if not self.server_required:
+			return
 		if self.server is None and self.server_internal:
-			self.server = WKAppServer(self.app, self.host, self.port)
+			self.server = WKAppServer(self.app, self.host, self.port, self.server_backend,
+			                          debug=self.debug, port_fallback=self.port_fallback,
+			                          workers=self.server_workers)
 			self.server.start()
+			# the webview must not load before the server accepts connections
+			if not self.server.wait_ready(self.server_timeout):
+				error = self.server.error
+				self.server = None
+				raise RuntimeError(f'WKApp server did not start on {self.host}:{self.port}: {error}')
+			self.port = self.server.port
+			self.startup_milestone('server_ready')
+			log.warning(f'WKApp - Server ready on {self.base_url} in {self.server.ready_time * 1000:.1f}ms')
 
 	def stop_server(self):
 		if not self.server is None and self.server_internal:
-			self.server.stop()
+			self.server.stop(self.server_drain_timeout)
 			self.server = None
 
 	def present(self, mode='fullscreen', no_cache = True, clear_cache = False, **kwargs):
@@ -610,21 +2764,182 @@ class WKApp:
 		self.clear_cache = clear_cache
 		self.app_view.load(self)
 		self.app_view.present(mode, **kwargs)
+		self.startup_milestone('presented')
+
+	def startup_milestone(self, name):
+		if not self.startup_start is None and not name in self.startup:
+			self.startup[name] = time.perf_counter() - self.startup_start
+
+	@property
+	def startup_stats(self):
+		stats = dict(self.startup)
+		if not self.server is None and self.server_internal:
+			stats['server_bind'] = self.server.ready_time
+			stats['port'] = self.server.port
+			stats['port_fallback'] = self.server.port != self.server.requested_port
+		return stats
 
 	def run(self, **kwargs):
 		log.warning(f'WKApp - Run')
+		self.startup_start = time.perf_counter()
 		self.start_server()
+		if not self.static is None:
+			self.static_thread = threading.Thread(target=self.prepare_static, daemon=True)
+			self.static_thread.start()
+		if self.warm_views:
+			self.warmup_thread = threading.Thread(target=self.warmup, daemon=True)
+			self.warmup_thread.start()
+		if self.hot_reload:
+			self.start_watcher()
 		self.present(**kwargs)
 
+	def start_watcher(self):
+		if self.watcher is None:
+			directories = [
+			 self.app_views_path, self.module_views_path, self.app_static_path,
+			 self.module_static_path
+			]
+			self.watcher = WKAppWatcher(list(dict.fromkeys(directories)), self.files_changed)
+			self.watcher.start()
+
+	def stop_watcher(self):
+		if not self.watcher is None:
+			self.watcher.stop()
+			self.watcher = None
+
+	def files_changed(self, filenames):
+		affected = self.views.invalidate_files(filenames)
+		static_paths = [os.path.abspath(p) + os.path.sep for p in (self.app_static_path, self.module_static_path)]
+		static_changed = any(os.path.abspath(f).startswith(tuple(static_paths)) for f in filenames)
+		if not self.static is None:
+			invalidated = self.static.invalidate(filenames)
+			if not self.static_arena is None:
+				self.static_arena.discard(invalidated)
+		if not self.page_cache is None:
+			# cached pages also link the previous static fingerprints
+			self.page_cache.invalidate(None if static_changed else affected)
+		views_changed = [uri for uri in affected if not uri.endswith('.html')]
+		log.warning(f'WKApp - Files changed {sorted(filenames)}, invalidated {sorted(affected)}')
+		if not self.hot_reload_push or self.app_webview is None:
+			return
+		if static_changed or len(views_changed) > 0 or self.view.path in affected:
+			self.app_webview.reload()
+
+	@property
+	def event_loop(self):
+		with self._event_loop_lock:
+			if self._event_loop is None:
+				self._event_loop = WKAppLoop(workers=self.scheme_workers)
+				self._event_loop.start()
+			return self._event_loop
+
+	def stop_event_loop(self):
+		with self._event_loop_lock:
+			if not self._event_loop is None:
+				self._event_loop.stop()
+				self._event_loop = None
+
+	@property
+	def coroutine_executor(self):
+		# fire and forget coroutines in thread mode share a bounded pool instead of a thread per call
+		with self._event_loop_lock:
+			if self._coroutine_executor is None:
+				self._coroutine_executor = ThreadPoolExecutor(max_workers=self.scheme_workers,
+				                                              thread_name_prefix='wkapp-coroutine')
+			return self._coroutine_executor
+
+	def stop_coroutine_executor(self):
+		with self._event_loop_lock:
+			if not self._coroutine_executor is None:
+				self._coroutine_executor.shutdown(wait=False)
+				self._coroutine_executor = None
+
+	@staticmethod
+	async def wait_for(coro, timeout):
+		if timeout is None:
+			return await coro
+		try:
+			return await asyncio.wait_for(coro, timeout)
+		except asyncio.TimeoutError:
+			raise TimeoutError(f'Coroutine did not finish within {timeout}s') from None
+
+	def run_coroutine(self, coro, wait=True, timeout=None):
+		# coroutine view events and invoke targets run on the app event loop in asyncio mode,
+		# otherwise on a private loop in the calling (or a pool) thread. the timeout cancels the
+		# coroutine and raises TimeoutError from it
+		coro = self.wait_for(coro, timeout)
+		if self.use_asyncio:
+			if not wait or self.event_loop.in_loop():
+				return self.event_loop.spawn(coro)
+			return self.event_loop.run_coroutine(coro)
+		if wait:
+			return asyncio.run(coro)
+
+		def done(future):
+			if not future.cancelled() and not future.exception() is None:
+				log.error(f'WKApp - Coroutine error {future.exception()}')
+
+		future = self.coroutine_executor.submit(asyncio.run, coro)
+		future.add_done_callback(done)
+		return future
+
+	def warmup(self, workers=4, instantiate=True):
+		start = time.perf_counter()
+		timings = self.views.warmup(workers=workers, instantiate=instantiate)
+		elapsed = time.perf_counter() - start
+		report = '\n'.join(f'      - {path}: ' + (f'{t * 1000:.1f}ms' if not t is None else 'failed')
+		                   for path, t in timings.items())
+		log.warning(f'WKApp - Warmup {len(timings)} views in {elapsed * 1000:.1f}ms\n{report}')
+		return timings
+
 	def exit(self):
 		if not self.app_view:
 			return
 		self.app_view.close()
 
 	def cleanup(self):
+		self.stop_watcher()
 		self.stop_server()
+		self.stop_event_loop()
+		self.stop_coroutine_executor()
+		self.close_session()
+		if not self.proxy_cache is None:
+			self.proxy_cache.flush()
+
+	@property
+	def session(self):
+		with self._session_lock:
+			if self._session is None:
+				self._session = self.create_session()
+			return self._session
+
+	def create_session(self):
+		# one keep-alive connection per scheme worker for each proxied host
+		pool_size = self.scheme_workers
+		webview = self.app_webview
+		if not webview is None and hasattr(webview, 'url_scheme_task_pool'):
+			pool_size = webview.url_scheme_task_pool.max_workers
+		retry = Retry(total=self.proxy_retries,
+		              backoff_factor=0.1,
+		              status_forcelist=(502, 503, 504))
+		adapter = HTTPAdapter(pool_connections=8,
+		                      pool_maxsize=pool_size,
+		                      max_retries=retry)
+		session = requests.Session()
+		session.mount('http://', adapter)
+		session.mount('https://', adapter)
+		return session
+
+	def close_session(self):
+		with self._session_lock:
+			if not self._session is None:
+				self._session.close()
+				self._session = None
 
 	def static_file(self, filepath, root='/'):
+		if root == '/' and not self.static is None:
+			# the app root is searched first, then the indexed static directories
+			return self.static.serve(filepath)
 		if root == '/':
 			root = self.app_path
 		if root != self.module_static_path and not os.path.exists(
@@ -635,11 +2950,61 @@ class WKApp:
 	def template(self, path, **kwargs):
 		return self.views.template(path, **kwargs)
 
+	def static_url(self, path):
+		# url of a static file, fingerprinted with its content hash so it can be cached as immutable
+		path = path.lstrip('/')
+		if path.startswith('static/'):
+			path = path[len('static/'):]
+		if self.static is None:
+			return '/static/' + path
+		return '/static/' + self.static.hashed_name(path)
+
+	def prepare_static(self):
+		start = time.perf_counter()
+		preloaded = self.static_arena.load() if not self.static_arena is None else 0
+		fingerprinted = self.static.fingerprint()
+		compressed = self.static.precompress() if self.static_precompress else 0
+		log.warning(f'WKApp - Static {preloaded} files preloaded, {fingerprinted} fingerprinted, '
+		            f'{compressed} compressed in {(time.perf_counter() - start) * 1000:.1f}ms')
+
+	def template_page(self, path, view):
+		# renders a GET for a template route, answering from the page cache and with 304 where possible
+		cache = self.page_cache
+		if cache is None:
+			return self.template(path, view=view)
+		path = self.views.get_url_path(path=path)[1]
+		version = view.event('cache_key')
+		key = module = cached = None
+		if not version is None:
+			try:
+				module = self.views.lookup.get_template(path).module
+			except TopLevelLookupException:
+				raise bottle.HTTPError(404, f'Template not found: {path}')
+			key = (path, self.views.view_key(request.url, path), version)
+			cached = cache.get(key, module)
+		if cached is None:
+			body = self.template(path, view=view).encode('utf-8')
+			etag = cache.etag(body)
+			if not key is None:
+				cache.put(key, module, etag, body, ttl=view.cache_ttl)
+		else:
+			etag, body = cached
+		# always revalidated, so pages are never served stale even when the webview caches them
+		response.set_header('ETag', etag)
+		response.set_header('Cache-Control', 'no-cache')
+		if cache.etag_matches(etag, request.get_header('If-None-Match')):
+			cache.not_modified += 1
+			response.status = 304
+			return b''
+		return body
+
 	def get_view(self, url=None, path=None, create=False):
-		view = self.views.get_view(url=url, path=path, create=create)
+		view, created = self.views.resolve_view(url=url, path=path, create=create)
 		log.warning(f'WKApp.get_view("{url}", "{path}", {create}) -> {view}')
 		if view is None:
 			return view
+		if not created and not view.refresh_on_get and request.method == 'GET':
+			return view
 		values = {}
 		query = {}
 		kwargs = {'request': request, 'values': values, 'query': query}
@@ -659,13 +3024,28 @@ class WKApp:
 
 	def setup_server_routes(self):
 
+		@route('/_wkapp/message', method='POST')
+		def server_message():
+			self.message_check_request(request)
+			try:
+				messages = WKMessageCodec.decode(request.body.read())
+			except WKMessageError as e:
+				raise bottle.HTTPError(400, str(e))
+			webview = self.app_webview
+			# every message is resolved before any is dispatched, a bad frame is rejected as a whole
+			resolved = [self.message_handlers(webview, message) for message in messages]
+			for handlers in resolved:
+				self.message_dispatch(webview, handlers)
+			response.status = 204
+			return b''
+
 		@route('/static/<filepath:path>')
 		def server_static(filepath):
 			return self.static_file(filepath)
 
 		@route('/<filepath:path>')
 		def server_template_get(filepath, view):
-			return self.template(filepath, view=view)
+			return self.template_page(filepath, view)
 
 		@route('/<filepath:path>', method='POST')
 		def server_template_post(filepath, view):
@@ -691,6 +3071,27 @@ class WKApp:
 	def views(self):
 		return self._views
 
+	@property
+	def template_stats(self):
+		return self.views.lookup.stats
+
+	@property
+	def views_stats(self):
+		return self.views.views.stats
+
+	@property
+	def static_stats(self):
+		if self.static is None:
+			return None
+		stats = self.static.stats
+		if not self.static_arena is None:
+			stats['arena'] = self.static_arena.stats
+		return stats
+
+	@property
+	def page_stats(self):
+		return self.page_cache.stats if not self.page_cache is None else None
+
 	@property
 	def view(self):
 		return self.views.view
@@ -704,43 +3105,259 @@ class WKApp:
 
 	def webview_did_finish_load(self, webview, url):
 		self.views.finish_load_view(url)
+		if not self.startup_start is None and not 'first_load' in self.startup:
+			self.startup_milestone('first_load')
+			log.warning(f'WKApp - Startup {self.startup_stats}')
 
-	def webview_on_invoke(self, sender, typ, context, target, args, kwargs):
-		url = sender.current_url
-		url, path = self.views.get_url_path(url=url)
-		log.warning(f'WKApp - INVOKE "{url}" "{typ}" "{context}" "{target}" "{args}" "{kwargs}"')
-		pycontext = None
+	def invoke_target(self, sender, typ, target):
 		if typ == "WKApp":
 			pycontext = self
+			table = WKInvokeTable.of(type(self), WKApp)
 		elif typ == "WKView":
-			if url == self.view.url:
-				pycontext = self.view
-			else:
-				pycontext = self.views.get_view(url=url, path=path)
+			pycontext = self.views.find_view(sender.current_url)
+			table = WKInvokeTable.of(type(pycontext), WKView)
 		else:
 			raise Exception(f"Context type {typ} unhandled")
-		if not hasattr(pycontext, target):
-			raise Exception(f"Target '{target}' not found in context {pycontext}")
-		pytarget = getattr(pycontext, target)
-		if not callable(pytarget):
-			raise Exception(
-			 f"Target '{target} {pytarget}' in context {pycontext} not callable")
-		pytarget(*args, **kwargs)
-		
+		return table.get(pycontext, target)
+
+	def webview_on_invoke(self, sender, typ, context, target, args, kwargs):
+		log.warning(f'WKApp - INVOKE "{sender.current_url}" "{typ}" "{context}" "{target}" "{args}" "{kwargs}"')
+		pytarget = self.invoke_target(sender, typ, target)
+		result = pytarget(*args, **kwargs)
+		if inspect.isawaitable(result):
+			self.run_coroutine(result, wait=False)
+
+	def webview_on_call(self, sender, id, typ, context, target, args, kwargs):
+		# like invoke, but the result (or exception) resolves the promise returned by app.call in javascript
+		log.warning(f'WKApp - CALL {id} "{sender.current_url}" "{typ}" "{target}" "{args}" "{kwargs}"')
+		try:
+			pytarget = self.invoke_target(sender, typ, target)
+			result = pytarget(*args, **kwargs)
+			if inspect.isawaitable(result):
+				# resolved from the future so a slow coroutine never holds the dispatcher thread,
+				# a timeout reaches the promise as a TimeoutError
+				future = self.run_coroutine(result, wait=False, timeout=self.calls.timeout)
+				future.add_done_callback(functools.partial(self.calls.resolve_future, sender, id))
+				return
+		except Exception as e:
+			self.calls.resolve(sender, id, error=e)
+			return
+		self.calls.resolve(sender, id, result)
+
+	@property
+	def message_origins(self):
+		# origins of pages allowed to post to /_wkapp/message
+		return (self.base_url, self.app_url.rstrip('/'))
+
+	def message_check_request(self, request):
+		# the binary channel acts on the app webview, only accept frames posted by the app's own pages.
+		# the content type cannot be sent cross origin without a CORS preflight, which is never granted
+		content_type = request.get_header('Content-Type', '').split(';', 1)[0].strip().lower()
+		if content_type != WKMessageCodec.content_type:
+			raise bottle.HTTPError(415, f'Expected Content-Type {WKMessageCodec.content_type}')
+		origin = request.get_header('Origin', None)
+		if not origin is None and not origin in self.message_origins:
+			raise bottle.HTTPError(403, f'Messages not accepted from origin {origin}')
+
+	def message_handlers(self, webview, message):
+		# resolves a decoded message to its handlers and arguments, raising an HTTPError if it is invalid
+		if not isinstance(message, dict):
+			raise bottle.HTTPError(400, f'Message must be a map not {type(message).__name__}')
+		name = message.get('handler', None)
+		args = message.get('args', [])
+		kwargs = message.get('kwargs', {})
+		if not isinstance(name, str) or not isinstance(args, list) or not isinstance(kwargs, dict):
+			raise bottle.HTTPError(400, 'Message requires a handler name, args list and kwargs map')
+		handler = getattr(webview, 'on_' + name, None) if not webview is None else None
+		deleg_handler = getattr(self, 'webview_on_' + name, None)
+		if handler is None and deleg_handler is None:
+			raise bottle.HTTPError(404, f'Unhandled message from script - name: {name}')
+		return handler, deleg_handler, args, kwargs
+
+	def message_dispatch(self, webview, handlers):
+		# binary channel counterpart to WKWebView script message handling, dispatched in the same order
+		handler, deleg_handler, args, kwargs = handlers
+
+		def handle_message():
+			if handler:
+				handler(*args, **kwargs)
+			if deleg_handler:
+				deleg_handler(webview, *args, **kwargs)
+
+		if webview is None:
+			handle_message()
+		else:
+			webview.dispatcher.dispatch_priority(WKWebView._webviewDispatcher.PRIORITY_MESSAGE,
+			                                     handle_message)
+
+	def scheme_environ(self, task):
+		body = task.body if not task.body is None else b''
+		query = task.query if task.query != 'None' else ''
+		environ = {
+		 'REQUEST_METHOD': task.method,
+		 'SCRIPT_NAME': '',
+		 'PATH_INFO': task.path if task.path.startswith('/') else '/' + task.path,
+		 'QUERY_STRING': query,
+		 'SERVER_NAME': 'localhost',
+		 'SERVER_PORT': str(self.port),
+		 'SERVER_PROTOCOL': 'HTTP/1.1',
+		 'CONTENT_LENGTH': str(len(body)),
+		 'wsgi.version': (1, 0),
+		 'wsgi.url_scheme': task.scheme,
+		 'wsgi.input': io.BytesIO(body),
+		 'wsgi.errors': sys.stderr,
+		 'wsgi.multithread': True,
+		 'wsgi.multiprocess': False,
+		 'wsgi.run_once': False,
+		}
+		for key, value in task.headers.items():
+			key = key.upper().replace('-', '_')
+			if key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+				environ[key] = value
+			else:
+				environ['HTTP_' + key] = value
+		environ.setdefault('HTTP_HOST', task.host)
+		return environ
+
+	def scheme_wsgi_dispatch(self, task):
+		environ = self.scheme_environ(task)
+		start = {}
+		written = []
+
+		def start_response(status, headers, exc_info=None):
+			start['status'] = int(status.split(' ', 1)[0])
+			response_headers = {}
+			for key, value in headers:
+				if key in response_headers:
+					value = response_headers[key] + ', ' + value
+				response_headers[key] = value
+			start['headers'] = response_headers
+			return written.append
+
+		result = self.app(environ, start_response)
+		if written:
+			body = written + [data for data in result]
+			if hasattr(result, 'close'):
+				result.close()
+			result = body
+		headers = start['headers']
+		task.stream(result,
+		            length=headers.get('Content-Length', None),
+		            status_code=start['status'],
+		            headers=headers,
+		            chunk_size=self.scheme_chunk_size)
+
+	def scheme_proxy(self, task, url, cache=None):
+		if task.method != 'GET':
+			cache = None
+		entry = cache.lookup(url) if not cache is None else None
+		if not entry is None and (cache.offline or cache.is_fresh(entry)):
+			cache.hits += 1
+			return self.scheme_proxy_cached(task, cache, entry)
+		if not cache is None and cache.offline:
+			task.finish(status_code=504, data=b'', content_type='text/plain')
+			return
+		request_headers = dict(task.headers)
+		if not entry is None:
+			request_headers.update(cache.conditional_headers(entry))
+		try:
+			response = self.session.request(task.method, url,
+				headers = request_headers,
+				data = task.body,
+				stream = True,
+				timeout = self.proxy_timeout)
+		except requests.RequestException as e:
+			if entry is None:
+				raise
+			log.warning(f'WKApp - Proxy request failed, serving stale cache entry for {url} {e}')
+			return self.scheme_proxy_cached(task, cache, entry)
+		if not entry is None and response.status_code == 304:
+			response.close()
+			cache.refresh(url, response.headers)
+			return self.scheme_proxy_cached(task, cache, entry)
+		headers = dict(response.headers)
+		length = headers.get('Content-Length', None)
+		if 'Content-Encoding' in headers:
+			# iter_content decodes the body so the upstream encoding and length no longer apply
+			del headers['Content-Encoding']
+			headers.pop('Content-Length', None)
+			length = None
+		headers.pop('Transfer-Encoding', None)
+		body = response.iter_content(chunk_size = self.scheme_chunk_size)
+		if not cache is None:
+			cache.misses += 1
+			if cache.is_cacheable(task.method, response.status_code, headers):
+				body = cache.store(url, response.status_code, headers, body)
+		try:
+			task.stream(
+				body,
+				content_type = headers.get('Content-Type'),
+				length = length,
+				status_code = response.status_code,
+				headers = headers,
+				chunk_size = self.scheme_chunk_size)
+		finally:
+			response.close()
+
+	def scheme_proxy_cached(self, task, cache, entry):
+		headers = dict(entry['headers'])
+		task.stream(
+			cache.read(entry, self.scheme_chunk_size),
+			content_type = cache.header(headers, 'Content-Type'),
+			length = entry['size'],
+			status_code = entry['status'],
+			headers = headers,
+			chunk_size = self.scheme_chunk_size)
+
 	def webview_scheme_wkapp(self, webview, task):
+		# served on the scheme task pool's worker thread in both modes. bottle and requests are
+		# synchronous, routing tasks through the event loop only added a thread hop per task
+		# (see test/bench_asyncio.py), coroutine view events raised here are awaited on the loop
+		self.scheme_wkapp(webview, task)
+
+	def scheme_static(self, task):
+		# answers a static file GET from the arena, False to leave the task to the http path
+		if task.method != 'GET' or not task.path.startswith('/static/'):
+			return False
+		if not WKAppProxyCache.header(task.headers, 'Range', None) is None:
+			return False
+		relpath, entry, immutable = self.static.resolve(urldecode(task.path[len('/static/'):]))
+		item = self.static_arena.get(relpath)
+		if item is None or not item[0] is entry:
+			return False
+		entry, view = item
+		self.static.requests += 1
+		if immutable:
+			self.static.fingerprinted += 1
+		headers = {
+		 'Cache-Control': self.static.immutable if immutable else 'no-cache',
+		 'ETag': entry.etag,
+		 'Accept-Ranges': 'bytes',
+		}
+		if WKAppPageCache.etag_matches(entry.etag, WKAppProxyCache.header(task.headers, 'If-None-Match')):
+			self.static.not_modified += 1
+			task.finish(data=b'', status_code=304, headers=headers)
+			return True
+		self.static.served += 1
+		task.receive_header(content_type=entry.content_type, headers=headers, length=len(view))
+		task.send(view, nocopy=True)
+		task.finish()
+		return True
+
+	def scheme_wkapp(self, webview, task):
 		command = task.host
-		if command == "localhost" or command == "proxy":
+		if command == "localhost" and not self.static_arena is None and self.scheme_static(task):
+			return
+		if command == "localhost" and self.scheme_wsgi:
+			self.scheme_wsgi_dispatch(task)
+		elif command == "localhost" or command == "proxy":
 			url = task.path
 			if command == "localhost":
 				url = self.base_url + url
+				self.scheme_proxy(task, url)
 			else:
 				url = urldecode(url[1:])
-			response = requests.request(task.method, url, headers = task.headers, data = task.body)
-			task.finish(
-				status_code=response.status_code, 
-				headers = response.headers,
-				data = response.content, 
-				content_type = response.headers.get('Content-Type'))
+				self.scheme_proxy(task, url, self.proxy_cache)
 
 
 if __name__ == '__main__':
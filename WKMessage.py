@@ -0,0 +1,211 @@
+'''
+WKMessage - compact binary framing for JavaScript <-> Python messages
+
+Frames carry a batch of messages in a schema versioned envelope. Values are
+tagged and length prefixed so bytes and typed arrays travel as raw bytes
+instead of being inflated through base64 or JSON. static/wkapp.js contains
+the matching encoder.
+
+Envelope: b'WKM' | version (u8) | flags (u8) | count (u32) | message * count
+Value:    tag (u8) | payload, all integers little-endian
+'''
+
+import array
+import struct
+import sys
+
+__all__ = ['WKMessageError', 'WKMessageCodec']
+
+
+class WKMessageError(ValueError):
+	pass
+
+
+class WKMessageCodec:
+
+	magic = b'WKM'
+	version = 1
+	content_type = 'application/x-wkapp-message'
+	# deepest nesting of lists and maps accepted, bounds recursion on hostile or cyclic values
+	max_depth = 64
+
+	NONE = ord('N')
+	TRUE = ord('T')
+	FALSE = ord('F')
+	INT = ord('i')
+	FLOAT = ord('d')
+	STR = ord('s')
+	BYTES = ord('b')
+	LIST = ord('l')
+	MAP = ord('m')
+	TYPED_ARRAY = ord('a')
+
+	# typed array codes shared with wkapp.js -> array.array typecodes
+	typed_arrays = {
+	 1: 'b', # Int8Array
+	 2: 'B', # Uint8Array, Uint8ClampedArray
+	 3: 'h', # Int16Array
+	 4: 'H', # Uint16Array
+	 5: 'i', # Int32Array
+	 6: 'I', # Uint32Array
+	 7: 'f', # Float32Array
+	 8: 'd', # Float64Array
+	 9: 'q', # BigInt64Array
+	 10: 'Q', # BigUint64Array
+	}
+	typecodes = {typecode: code for code, typecode in typed_arrays.items()}
+
+	header = struct.Struct('<3sBBI')
+	u8 = struct.Struct('<B')
+	u32 = struct.Struct('<I')
+	i64 = struct.Struct('<q')
+	f64 = struct.Struct('<d')
+
+	@classmethod
+	def encode(cls, messages, flags=0):
+		out = bytearray(cls.header.pack(cls.magic, cls.version, flags, len(messages)))
+		for message in messages:
+			cls.encode_value(message, out)
+		return bytes(out)
+
+	@classmethod
+	def decode(cls, data):
+		view = memoryview(data)
+		if len(view) < cls.header.size:
+			raise WKMessageError('Frame too short')
+		magic, version, flags, count = cls.header.unpack_from(view, 0)
+		if magic != cls.magic:
+			raise WKMessageError('Not a WKMessage frame')
+		if version != cls.version:
+			raise WKMessageError(f'Unsupported WKMessage version {version}')
+		offset = cls.header.size
+		messages = []
+		for _ in range(count):
+			try:
+				value, offset = cls.decode_value(view, offset)
+			except (struct.error, UnicodeDecodeError) as e:
+				raise WKMessageError(f'Malformed frame {e}') from e
+			messages.append(value)
+		if offset != len(view):
+			raise WKMessageError(f'{len(view) - offset} trailing bytes in frame')
+		return messages
+
+	@classmethod
+	def encode_value(cls, value, out, depth=0):
+		if depth > cls.max_depth:
+			raise WKMessageError('Value nested too deeply')
+		if value is None:
+			out.append(cls.NONE)
+		elif value is True:
+			out.append(cls.TRUE)
+		elif value is False:
+			out.append(cls.FALSE)
+		elif isinstance(value, int):
+			try:
+				data = cls.i64.pack(value)
+			except struct.error as e:
+				raise WKMessageError(f'Integer {value} out of range') from e
+			out.append(cls.INT)
+			out += data
+		elif isinstance(value, float):
+			out.append(cls.FLOAT)
+			out += cls.f64.pack(value)
+		elif isinstance(value, str):
+			data = value.encode('utf-8')
+			out.append(cls.STR)
+			out += cls.u32.pack(len(data))
+			out += data
+		elif isinstance(value, array.array):
+			if not value.typecode in cls.typecodes:
+				raise WKMessageError(f'Unsupported array typecode {value.typecode}')
+			if sys.byteorder != 'little':
+				value = array.array(value.typecode, value)
+				value.byteswap()
+			data = value.tobytes()
+			out.append(cls.TYPED_ARRAY)
+			out.append(cls.typecodes[value.typecode])
+			out += cls.u32.pack(len(data))
+			out += data
+		elif isinstance(value, (bytes, bytearray, memoryview)):
+			out.append(cls.BYTES)
+			out += cls.u32.pack(len(value))
+			out += value
+		elif isinstance(value, (list, tuple)):
+			out.append(cls.LIST)
+			out += cls.u32.pack(len(value))
+			for item in value:
+				cls.encode_value(item, out, depth + 1)
+		elif isinstance(value, dict):
+			out.append(cls.MAP)
+			out += cls.u32.pack(len(value))
+			for key, item in value.items():
+				cls.encode_value(str(key), out)
+				cls.encode_value(item, out, depth + 1)
+		else:
+			raise WKMessageError(f'Cannot encode {type(value).__name__}')
+
+	@classmethod
+	def _take(cls, view, offset, size):
+		end = offset + size
+		if end > len(view):
+			raise WKMessageError('Truncated frame')
+		return view[offset:end], end
+
+	@classmethod
+	def decode_value(cls, view, offset, depth=0):
+		if depth > cls.max_depth:
+			raise WKMessageError('Frame nested too deeply')
+		if offset >= len(view):
+			raise WKMessageError('Truncated frame')
+		tag = view[offset]
+		offset += 1
+		if tag == cls.NONE:
+			return None, offset
+		if tag == cls.TRUE:
+			return True, offset
+		if tag == cls.FALSE:
+			return False, offset
+		if tag == cls.INT:
+			data, offset = cls._take(view, offset, cls.i64.size)
+			return cls.i64.unpack(data)[0], offset
+		if tag == cls.FLOAT:
+			data, offset = cls._take(view, offset, cls.f64.size)
+			return cls.f64.unpack(data)[0], offset
+		if tag in (cls.STR, cls.BYTES, cls.TYPED_ARRAY):
+			code = None
+			if tag == cls.TYPED_ARRAY:
+				data, offset = cls._take(view, offset, 1)
+				code = data[0]
+			data, offset = cls._take(view, offset, cls.u32.size)
+			data, offset = cls._take(view, offset, cls.u32.unpack(data)[0])
+			if tag == cls.STR:
+				return str(data, 'utf-8'), offset
+			if tag == cls.BYTES:
+				return bytes(data), offset
+			typecode = cls.typed_arrays.get(code, None)
+			if typecode is None:
+				raise WKMessageError(f'Unknown typed array code {code}')
+			value = array.array(typecode)
+			if len(data) % value.itemsize:
+				raise WKMessageError('Typed array length is not a multiple of its item size')
+			value.frombytes(data)
+			if sys.byteorder != 'little':
+				value.byteswap()
+			return value, offset
+		if tag in (cls.LIST, cls.MAP):
+			data, offset = cls._take(view, offset, cls.u32.size)
+			count = cls.u32.unpack(data)[0]
+			if tag == cls.LIST:
+				items = []
+				for _ in range(count):
+					item, offset = cls.decode_value(view, offset, depth + 1)
+					items.append(item)
+				return items, offset
+			items = {}
+			for _ in range(count):
+				key, offset = cls.decode_value(view, offset, depth + 1)
+				if not isinstance(key, str): # as encoded by both sides
+					raise WKMessageError(f'Map key must be a string not {type(key).__name__}')
+				items[key], offset = cls.decode_value(view, offset, depth + 1)
+			return items, offset
+		raise WKMessageError(f'Unknown value tag {tag}')
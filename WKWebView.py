@@ -21,6 +21,9 @@ __version__ = '1.2'
 from objc_util import *
 import ui, console, webbrowser
 import queue, weakref, ctypes, functools, time, os, json, re, sys
+import collections
+import asyncio
+import concurrent.futures
 from types import SimpleNamespace
 import threading
 import time
@@ -70,6 +73,9 @@ class WKWebView(ui.View):
 	             inline_media=None,
 	             airplay_media=True,
 	             pip_media=True,
+	             scheme_workers=4,
+	             scheme_warm_workers=1,
+	             scheme_idle_timeout=5.0,
 	             **kwargs):
 
 		self._init_webview()
@@ -82,7 +88,10 @@ class WKWebView(ui.View):
 		self.request_url = ''
 		self.requested_url = ''
 		self.current_url = ''
-		self.eval_js_queue = queue.Queue()
+		self.eval_js_timeout = 30.0
+		self._eval_js_id = 0
+		self._eval_js_futures = {}
+		self._eval_js_lock = threading.Lock()
 
 		self.dispatcher = WKWebView._webviewDispatcher()
 
@@ -145,7 +154,11 @@ class WKWebView(ui.View):
 					self.url_scheme_handlers[scheme] = getattr(self, key)
 					webview_config.setURLSchemeHandler_forURLScheme_(url_scheme_handler, scheme)
 				
-		self.url_scheme_task_pool = WKWebView._urlSchemeTaskPool(self.url_scheme_handlers)
+		self.url_scheme_task_pool = WKWebView._urlSchemeTaskPool(
+		 self.url_scheme_handlers,
+		 min_workers=scheme_warm_workers,
+		 max_workers=scheme_workers,
+		 idle_timeout=scheme_idle_timeout)
 		self.init_webview_config(webview_config)
 		self._create_webview(webview_config, nav_delegate, ui_delegate)
 
@@ -164,6 +177,7 @@ class WKWebView(ui.View):
 
 	def will_close(self):
 		self.dispatcher.stop(join=False)
+		self.url_scheme_task_pool.stop()
 
 	@on_main_thread
 	def close(self):
@@ -256,28 +270,85 @@ class WKWebView(ui.View):
 			root = os.path.dirname(root)
 		self.load_url('file://' + os.path.join(root, path), no_cache=True)
 
-	def eval_js(self, js):
-		self.eval_js_async(js, self._eval_js_sync_callback)
-		value = self.eval_js_queue.get()
-		return value
+	class JavascriptError(Exception):
+		pass
+
+	def eval_js(self, js, timeout=None):
+		"""Evaluates js and waits for its result. Must be called outside the main thread.
+
+        Waits at most `timeout` seconds (default `eval_js_timeout`), raising
+        `concurrent.futures.TimeoutError` if the evaluation does not complete.
+        Javascript errors are logged and return None.
+        """
+		timeout = self.eval_js_timeout if timeout is None else timeout
+		future = self.eval_js_async(js)
+		try:
+			return future.result(timeout)
+		except concurrent.futures.TimeoutError:
+			future.cancel()
+			raise
+		except WKWebView.JavascriptError as e:
+			log.warning(f'WKWebView javascript error {e}')
+			return None
 
 	evaluate_javascript = eval_js
 
-	@on_main_thread
-	def _eval_js_sync_callback(self, value):
-		self.eval_js_queue.put(value)
+	def eval_js_async(self, js, callback=None):
+		"""Starts evaluating js and returns a `concurrent.futures.Future` for its result.
+
+        Each call is correlated with its own completion by id so concurrent
+        callers never receive each other's results. Cancelling the future
+        discards the result when it arrives.
+        """
+		future = concurrent.futures.Future()
+		with self._eval_js_lock:
+			self._eval_js_id += 1
+			id = self._eval_js_id
+			self._eval_js_futures[id] = future
+		future.add_done_callback(functools.partial(self._eval_js_done, id))
+		if callback:
+			future.add_done_callback(
+			 lambda future: callback(None if future.cancelled() or future.exception() else future.result()))
+		self._eval_js_start(id, js)
+		return future
+
+	async def eval_js_await(self, js, timeout=None):
+		future = asyncio.wrap_future(self.eval_js_async(js))
+		return await asyncio.wait_for(future, timeout)
+
+	def eval_js_gather(self, scripts, timeout=None):
+		"""Evaluates many scripts concurrently and returns their results in order."""
+		timeout = self.eval_js_timeout if timeout is None else timeout
+		futures = [self.eval_js_async(js) for js in scripts]
+		done, pending = concurrent.futures.wait(futures, timeout)
+		if pending:
+			for future in pending:
+				future.cancel()
+			raise concurrent.futures.TimeoutError(f'{len(pending)} of {len(futures)} evaluations timed out')
+		return [
+		 None if isinstance(future.exception(), WKWebView.JavascriptError) else future.result()
+		 for future in futures
+		]
+
+	def _eval_js_done(self, id, future):
+		with self._eval_js_lock:
+			self._eval_js_futures.pop(id, None)
 
 	@ui.in_background
-	def eval_js_async(self, js, callback=None):
+	def _eval_js_start(self, id, js):
+		with self._eval_js_lock:
+			future = self._eval_js_futures.get(id, None)
+		if future is None or future.cancelled():
+			return
 		if self.log_js_evals:
-			self.console.message({'level': 'code', 'content': js})
-		handler = functools.partial(WKWebView._handle_completion, callback, self)
+			self._message({'level': 'code', 'content': js})
+		handler = functools.partial(WKWebView._handle_completion, id, self)
 		block = ObjCBlock(handler,
 		                  restype=None,
 		                  argtypes=[c_void_p, c_void_p, c_void_p])
 		retain_global(block)
 		self.webview.evaluateJavaScript_completionHandler_(js, block)
-		
+
 	@ui.in_background
 	def clear_cache_async(self, completion_handler=None):
 		store = WKWebView.WKWebsiteDataStore.defaultDataStore()
@@ -294,12 +365,21 @@ class WKWebView(ui.View):
 	def clear_cache(self, completion_handler=None):
 		self.clear_cache_async(completion_handler)
 
-	def _handle_completion(callback, webview, _cmd, _obj, _err):
+	def _handle_completion(id, webview, _cmd, _obj, _err):
 		result = str(ObjCInstance(_obj)) if _obj else None
 		if webview.log_js_evals:
 			webview._message({'level': 'raw', 'content': str(result)})
-		if callback:
-			callback(result)
+		with webview._eval_js_lock:
+			future = webview._eval_js_futures.get(id, None)
+		if future is None or future.done():
+			return
+		try:
+			if _err and not _obj:
+				future.set_exception(WKWebView.JavascriptError(str(ObjCInstance(_err))))
+			else:
+				future.set_result(result)
+		except concurrent.futures.InvalidStateError: # cancelled meanwhile
+			pass
 
 	def add_script(self, js_script, add_to_end=True, all_frames=False):
 		location = 1 if add_to_end else 0
@@ -592,6 +672,7 @@ class WKWebView(ui.View):
 	WKWebsiteDataStore = ObjCClass('WKWebsiteDataStore')
 	NSDate = ObjCClass('NSDate')
 	NSHTTPURLResponse = ObjCClass('NSHTTPURLResponse')
+	NSData = ObjCClass('NSData')
 	UIDevice = ObjCClass('UIDevice')
 	# Navigation delegate
 
@@ -649,23 +730,66 @@ class WKWebView(ui.View):
 	# thread dispatcher
 	class _webviewDispatcher(threading.Thread):
 
+		# message priorities, lower values are dispatched first
+		PRIORITY_NAVIGATION = 0
+		PRIORITY_DEFAULT = 1
+		PRIORITY_MESSAGE = 2
+		PRIORITIES = (PRIORITY_NAVIGATION, PRIORITY_DEFAULT, PRIORITY_MESSAGE)
+
+		_stop_sentinel = object()
+
 		def __init__(self):
 			super().__init__()
 			self.daemon = True
 			self.running = False
-			self.queue = []
+			self.stopping = False # set by stop(), no further messages are accepted
+			self.queues = {priority: collections.deque() for priority in self.PRIORITIES}
+			self.condition = threading.Condition()
+			self.stats = {
+			 'dispatched': 0,
+			 'processed': 0,
+			 'errors': 0,
+			 'rejected': 0,
+			 'max_depth': 0,
+			 'wait_time': 0.0,
+			 'max_wait_time': 0.0,
+			}
 
 		class _dispatchMessage:
 
+			__slots__ = ('func', 'args', 'kwargs', 'queued')
+
 			def __init__(self, func, *args, **kwargs):
 				self.func = func
 				self.args = args
 				self.kwargs = kwargs
+				self.queued = time.perf_counter()
+
+		@property
+		def depth(self):
+			with self.condition:
+				return sum(len(q) for q in self.queues.values())
 
 		def dispatch(self, func, *args, **kwargs):
-			self.queue.append(self._dispatchMessage(func, *args, **kwargs))
+			self.dispatch_priority(self.PRIORITY_DEFAULT, func, *args, **kwargs)
+
+		def dispatch_priority(self, priority, func, *args, **kwargs):
+			msg = self._dispatchMessage(func, *args, **kwargs)
+			with self.condition:
+				if self.stopping:
+					self.stats['rejected'] += 1
+					return
+				self.queues[priority].append(msg)
+				self.stats['dispatched'] += 1
+				depth = sum(len(q) for q in self.queues.values())
+				if depth > self.stats['max_depth']:
+					self.stats['max_depth'] = depth
+				self.condition.notify()
 
 		def invoke(self, instance, name, *args, **kwargs):
+			self.invoke_priority(self.PRIORITY_NAVIGATION, instance, name, *args, **kwargs)
+
+		def invoke_priority(self, priority, instance, name, *args, **kwargs):
 
 			def _instance_invoke(instance, name, *args, **kwargs):
 				func = getattr(instance, name) if hasattr(instance, name) else None
@@ -676,28 +800,48 @@ class WKWebView(ui.View):
 				if func:
 					func(instance, *args, **kwargs)
 
-			self.dispatch(_instance_invoke, instance, name, *args, **kwargs)
+			self.dispatch_priority(priority, _instance_invoke, instance, name, *args, **kwargs)
+
+		def _next_message(self):
+			with self.condition:
+				while True:
+					for priority in self.PRIORITIES:
+						q = self.queues[priority]
+						if len(q) > 0:
+							return q.popleft()
+					self.condition.wait()
 
 		def run(self):
 			self.running = True
 			while self.running:
-				if len(self.queue) < 1:
-					time.sleep(0.01)
-				else:
-					while len(self.queue) > 0 and self.running:
-						msg = self.queue.pop(0)
-						func = msg.func
-						args = msg.args
-						kwargs = msg.kwargs
-						if func:
-							try:
-								func(*args, **kwargs)
-							except Exception as e:
-								log.error(f"WKWebView dispatch error {e}, {func}, {args}, {kwargs}")
-
-		def stop(self, join=True):
+				msg = self._next_message()
+				if msg is self._stop_sentinel:
+					break
+				wait = time.perf_counter() - msg.queued
+				self.stats['wait_time'] += wait
+				if wait > self.stats['max_wait_time']:
+					self.stats['max_wait_time'] = wait
+				func = msg.func
+				args = msg.args
+				kwargs = msg.kwargs
+				if func:
+					try:
+						func(*args, **kwargs)
+					except Exception as e:
+						self.stats['errors'] += 1
+						log.error(f"WKWebView dispatch error {e}, {func}, {args}, {kwargs}")
+				self.stats['processed'] += 1
 			self.running = False
-			if join:
+
+		def stop(self, join=True, drain=False):
+			with self.condition:
+				self.stopping = True
+				if drain: # process everything already queued before stopping
+					self.queues[self.PRIORITIES[-1]].append(self._stop_sentinel)
+				else:
+					self.queues[self.PRIORITIES[0]].appendleft(self._stop_sentinel)
+				self.condition.notify()
+			if join and self.is_alive() and threading.current_thread() is not self:
 				self.join()
 
 	# https://developer.apple.com/library/archive/documentation/Cocoa/Conceptual/ObjCRuntimeGuide/Articles/ocrtTypeEncodings.html
@@ -772,12 +916,15 @@ class WKWebView(ui.View):
 			kwargs = {}
 			try:
 				data = json.loads(content)
+			except ValueError: # not json, pass the raw string
+				data = None
+			if isinstance(data, dict):
 				if 'args' in data or 'kwargs' in data:
 					args = data['args'] if 'args' in data else args
 					kwargs = data['kwargs'] if 'kwargs' in data else kwargs
 				else:
 					kwargs = data
-			except:
+			else:
 				args.append(content)
 
 			handled = False
@@ -791,8 +938,9 @@ class WKWebView(ui.View):
 				raise Exception(
 				 f'Unhandled message from script - name: {name}, content: {content}')
 
-		webview.dispatcher.dispatch(handle_script_message, webview, name, content,
-		                            handler, deleg_handler)
+		webview.dispatcher.dispatch_priority(WKWebView._webviewDispatcher.PRIORITY_MESSAGE,
+		                                     handle_script_message, webview, name, content,
+		                                     handler, deleg_handler)
 
 	CustomMessageHandler = create_objc_class(
 	 'CustomMessageHandler',
@@ -907,12 +1055,14 @@ class WKWebView(ui.View):
 				
 				self.response = None
 				self.receive_response = None
+				self.bytes_sent = 0
 				self.finished = False
 				self.handler = None
 				self.running = False
 				self.cancel = False
 				self.successful = False
 				self.started = False
+				self.stopped = False
 				self.terminated = False
 				self.error = None
 
@@ -946,38 +1096,87 @@ class WKWebView(ui.View):
 				if response is None and data is None:
 					raise Exception('Must specify one or both of response and response data')
 				if not response is None or (not data is None and self.receive_response is None):
-					if not self.receive_response is None:
-						raise Exception('Response header already sent')
-					response = {} if response is None else response
-					url = response.get('url', self.url)
-					status = response.get('status', status_code)
-					version = response.get('version', 'HTTP/1.1')
-					response_headers = response.get('headers',{})
-					headers_copy = {}
-					for k in response_headers.keys():
-						headers_copy[k]=response_headers[k]
-					for k in headers.keys():
-						headers_copy[k]=headers[k]
-					headers = headers_copy
-					headers.setdefault('Content-Type', 'application/octet-stream')
-					headers.setdefault('Content-Length', '0')
-					if not content_type is None:
-						headers['Content-Type'] = content_type
-					if not data is None:
-						headers['Content-Length'] = str(len(data))
-
-					origin = self.headers.get('Origin', None)
-					if not origin is None: # permit CORS when Origin specified
-						headers.setdefault("Access-Control-Allow-Origin", origin)
-					url = nsurl(url)
-					httpResponse = WKWebView.NSHTTPURLResponse.new()
-					httpResponse.initWithURL_statusCode_HTTPVersion_headerFields_(url, status, version, headers)
-					if not self.pool.is_stopped(self):
-						self.task.didReceiveResponse(httpResponse)
-					self.receive_response = httpResponse
+					length = len(data) if not data is None else None
+					self.receive_header(response, content_type, status_code, headers, length)
 				if not data is None:
 					if not self.pool.is_stopped(self):
-						self.task.didReceiveData(data)
+						self.send(data)
+
+			def receive_header(self, response=None, content_type=None, status_code=200, headers={}, length=None, chunked=False):
+				if not self.receive_response is None:
+					raise Exception('Response header already sent')
+				response = {} if response is None else response
+				url = response.get('url', self.url)
+				status = response.get('status', status_code)
+				version = response.get('version', 'HTTP/1.1')
+				response_headers = response.get('headers',{})
+				headers_copy = {}
+				for k in response_headers.keys():
+					headers_copy[k]=response_headers[k]
+				for k in headers.keys():
+					headers_copy[k]=headers[k]
+				headers = headers_copy
+				headers.setdefault('Content-Type', 'application/octet-stream')
+				if not chunked:
+					headers.setdefault('Content-Length', '0')
+				if not content_type is None:
+					headers['Content-Type'] = content_type
+				if not length is None:
+					headers['Content-Length'] = str(length)
+
+				origin = self.headers.get('Origin', None)
+				if not origin is None: # permit CORS when Origin specified
+					headers.setdefault("Access-Control-Allow-Origin", origin)
+				url = nsurl(url)
+				httpResponse = WKWebView.NSHTTPURLResponse.new()
+				httpResponse.initWithURL_statusCode_HTTPVersion_headerFields_(url, status, version, headers)
+				if not self.pool.is_stopped(self):
+					self.task.didReceiveResponse(httpResponse)
+				self.receive_response = httpResponse
+
+			def stream(self, iterable, content_type=None, length=None, status_code=200, headers={}, response=None, chunk_size=65536):
+				# sends the response header once then each chunk of iterable as it is produced,
+				# only one chunk is held at a time. Content-Length is omitted when length is unknown.
+				if self.cancel:
+					return
+				if self.finished:
+					raise Exception('Stream must not be called after finish.')
+				if response is None and not self.response is None:
+					response = self.response
+				try:
+					self.receive_header(response, content_type, status_code, headers, length, chunked=length is None)
+					for data in iterable:
+						if self.cancel or self.pool.is_stopped(self):
+							break
+						if not data:
+							continue
+						if len(data) > chunk_size:
+							view = memoryview(data)
+							for offset in range(0, len(view), chunk_size):
+								self.send(view[offset:offset + chunk_size])
+						else:
+							self.send(data)
+				finally:
+					if hasattr(iterable, 'close'):
+						iterable.close()
+				self.finish()
+
+			def send(self, data, nocopy=False):
+				# with nocopy a writable memoryview is passed to webkit without copying, its
+				# buffer (e.g. an mmap arena) must stay alive and unchanged while the webview is
+				if self.cancel or self.pool.is_stopped(self):
+					return
+				length = data.nbytes if isinstance(data, memoryview) else len(data)
+				if length == 0: # c_char.from_buffer rejects empty buffers, and there is nothing to send
+					return
+				if nocopy and isinstance(data, memoryview) and not data.readonly and data.c_contiguous:
+					address = ctypes.addressof(ctypes.c_char.from_buffer(data))
+					data = WKWebView.NSData.dataWithBytesNoCopy_length_freeWhenDone_(
+					 c_void_p(address), length, False)
+				elif isinstance(data, memoryview):
+					data = data.tobytes()
+				self.task.didReceiveData(data)
+				self.bytes_sent += length
 
 			def finish(self, **kwargs):
 				if self.cancel:
@@ -1005,28 +1204,29 @@ class WKWebView(ui.View):
 
 		class _urlSchemeTaskWorker(threading.Thread):
 
-			def __init__(self, pool):
+			def __init__(self, pool, core=False):
 				super().__init__()
 				self.daemon = True
 				self.pool = pool
+				self.core = core # core workers stay warm and never time out
 				self.running = False
-				self.idle = 0
-				self.max_idle = 5
 
 			def run(self):
 				self.running = True
 				while self.running:
-					task = self.pool.next_task()
-					if not task is None:
-						self.idle = 0
-						task.run()
-					elif self.idle < self.max_idle:
-						sleep = time.time()
-						time.sleep(0.1)
-						sleep = time.time() - sleep
-						self.idle = self.idle + sleep
-					else:
+					timeout = None if self.core else self.pool.idle_timeout
+					task = self.pool.next_task(timeout)
+					if task is self.pool._stop_sentinel:
 						break
+					if task is None:
+						if self.pool.worker_retire(self):
+							break
+						continue
+					self.pool.worker_busy(1)
+					try:
+						task.run()
+					finally:
+						self.pool.worker_busy(-1, finished=True)
 				self.running = False
 				self.pool.worker_cleanup(self)
 
@@ -1035,68 +1235,104 @@ class WKWebView(ui.View):
 				if join:
 					self.join()
 
-		def __init__(self, handlers):
+		_stop_sentinel = object()
+
+		def __init__(self, handlers, min_workers=1, max_workers=4, idle_timeout=5.0, target_load=1.0):
 			self.handlers = handlers
 			self.workers = []
-			self.queue = []
+			self.queue = queue.Queue()
 			self.tasks = {}
-			self.stopped = {}
-			self.max_workers = 4
+			self.min_workers = min_workers
+			self.max_workers = max(max_workers, min_workers, 1)
+			self.idle_timeout = idle_timeout
+			# outstanding tasks per worker above which another worker is started
+			self.target_load = target_load
+			self.busy = 0
+			# tasks started and not yet finished, counted under worker_lock when a task is started and
+			# when it finishes, so the load never misses a task a worker has taken but not yet run
+			self.outstanding = 0
 			self.tasks_lock = threading.Lock()
-			self.queue_lock = threading.Lock()
 			self.worker_lock = threading.Lock()
-			
+
+		@property
+		def load(self):
+			# outstanding tasks (queued and running) per worker
+			with self.worker_lock:
+				return self._load()
+
+		def _load(self):
+			worker_count = len(self.workers)
+			return self.outstanding / worker_count if worker_count > 0 else float(self.outstanding)
+
 		def task_start(self, id, task, request):
-			task_count = 0
 			with self.tasks_lock:
 				if id in self.tasks:
 					return
 				pool_task = self._urlSchemeTask(self, id, task, request)
 				pool_task.handler = self.handlers[pool_task.scheme]
 				self.tasks[id] = pool_task
-				task_count = len(self.tasks)
-			with self.queue_lock:
-				self.queue.append(pool_task)
-			
 			with self.worker_lock:
-				worker_count = len(self.workers)
-				avail = worker_count / task_count
-				#print(avail, worker_count,task_count, self.max_workers / task_count)
-				if avail < 0.25 and worker_count < self.max_workers:
-					worker = self._urlSchemeTaskWorker(self)
-					self.workers.append(worker)
-					worker.start()
-		
-		def worker_cleanup(self,worker):
+				self.outstanding += 1
+			self.queue.put(pool_task)
+			self.scale()
+
+		def scale(self):
 			with self.worker_lock:
-				self.workers.remove(worker)
-		
+				core_count = sum(1 for worker in self.workers if worker.core)
+				while core_count < self.min_workers and len(self.workers) < self.max_workers:
+					self._worker_start(core=True)
+					core_count += 1
+				while self._load() > self.target_load and len(self.workers) < self.max_workers:
+					self._worker_start()
+
+		def _worker_start(self, core=False):
+			worker = self._urlSchemeTaskWorker(self, core)
+			self.workers.append(worker)
+			worker.start()
+
+		def worker_busy(self, delta, finished=False):
+			with self.worker_lock:
+				self.busy += delta
+				if finished:
+					self.outstanding -= 1
+
+		def worker_retire(self, worker):
+			with self.worker_lock:
+				if self.outstanding > self.busy: # tasks are waiting for a worker
+					return False
+				if worker in self.workers:
+					self.workers.remove(worker)
+				return True
+
+		def worker_cleanup(self, worker):
+			with self.worker_lock:
+				if worker in self.workers:
+					self.workers.remove(worker)
+
+		def stop(self):
+			with self.worker_lock:
+				workers = list(self.workers)
+			for worker in workers:
+				self.queue.put(self._stop_sentinel)
+
 		def task_stop(self, id, task, request):
 			with self.tasks_lock:
 				if not id in self.tasks:
 					return
-				pool_task = self.tasks[id]
-				self.stopped[id] = pool_task
-				
+				self.tasks[id].stopped = True
+
 		def is_stopped(self, task):
-			time.sleep(0.01)
-			with self.tasks_lock:
-				return task.id in self.stopped
-			
-		def task_cleanup(self,task):
-			id = task.id
+			return task.stopped
+
+		def task_cleanup(self, task):
 			with self.tasks_lock:
-				if id in self.tasks:
-					del self.tasks[id]
-				if id in self.stopped:
-					del self.stopped[id]
-
-		def next_task(self):
-			task = None
-			with self.queue_lock:
-				if len(self.queue) > 0:
-					task = self.queue.pop(0)
-			return task
+				self.tasks.pop(task.id, None)
+
+		def next_task(self, timeout=None):
+			try:
+				return self.queue.get(timeout=timeout)
+			except queue.Empty:
+				return None
 
 	def webView_startURLSchemeTask_(_self, _cmd, _webview, _task):
 		delegate_instance = ObjCInstance(_self)
@@ -1,6 +1,7 @@
 __version__ = '0.0.1'
 
 from .WKWebView import *
+from .WKMessage import *
 from .WKApp import *
 
 # mostly convenience includes for bottle
@@ -1,8 +1,160 @@
+class WKMessageEncoder {
+	// binary message frames, decoded by WKMessage.WKMessageCodec in python
+	constructor() {
+		this.buffer = new ArrayBuffer(1024);
+		this.bytes = new Uint8Array(this.buffer);
+		this.view = new DataView(this.buffer);
+		this.offset = 0;
+		this.text = new TextEncoder();
+	}
+
+	reserve(size) {
+		const required = this.offset + size;
+		if (required <= this.buffer.byteLength)
+			return;
+		let length = this.buffer.byteLength * 2;
+		while (length < required)
+			length *= 2;
+		const buffer = new ArrayBuffer(length);
+		new Uint8Array(buffer).set(this.bytes.subarray(0, this.offset));
+		this.buffer = buffer;
+		this.bytes = new Uint8Array(buffer);
+		this.view = new DataView(buffer);
+	}
+
+	u8(value) {
+		this.reserve(1);
+		this.view.setUint8(this.offset, value);
+		this.offset += 1;
+	}
+
+	u32(value) {
+		this.reserve(4);
+		this.view.setUint32(this.offset, value, true);
+		this.offset += 4;
+	}
+
+	raw(bytes) {
+		this.u32(bytes.byteLength);
+		this.reserve(bytes.byteLength);
+		this.bytes.set(bytes, this.offset);
+		this.offset += bytes.byteLength;
+	}
+
+	value(value, depth = 0) {
+		if (depth > WKMessageEncoder.maxDepth)
+			throw new Error('WKMessage nesting too deep');
+		if (value === null || value === undefined || typeof value === 'function') {
+			this.u8(WKMessageEncoder.NONE);
+		} else if (value === true || value === false) {
+			this.u8(value ? WKMessageEncoder.TRUE : WKMessageEncoder.FALSE);
+		} else if (typeof value === 'bigint' || (typeof value === 'number' && Number.isSafeInteger(value))) {
+			this.u8(WKMessageEncoder.INT);
+			this.reserve(8);
+			this.view.setBigInt64(this.offset, BigInt(value), true);
+			this.offset += 8;
+		} else if (typeof value === 'number') {
+			this.u8(WKMessageEncoder.FLOAT);
+			this.reserve(8);
+			this.view.setFloat64(this.offset, value, true);
+			this.offset += 8;
+		} else if (typeof value === 'string') {
+			this.u8(WKMessageEncoder.STR);
+			this.raw(this.text.encode(value));
+		} else if (value instanceof ArrayBuffer) {
+			this.u8(WKMessageEncoder.BYTES);
+			this.raw(new Uint8Array(value));
+		} else if (value instanceof DataView) {
+			this.u8(WKMessageEncoder.BYTES);
+			this.raw(new Uint8Array(value.buffer, value.byteOffset, value.byteLength));
+		} else if (ArrayBuffer.isView(value)) {
+			const code = WKMessageEncoder.typedArrays[value.constructor.name];
+			if (code === undefined)
+				throw new Error(`WKMessage unsupported typed array ${value.constructor.name}`);
+			this.u8(WKMessageEncoder.TYPED_ARRAY);
+			this.u8(code);
+			this.raw(new Uint8Array(value.buffer, value.byteOffset, value.byteLength));
+		} else if (Array.isArray(value)) {
+			this.u8(WKMessageEncoder.LIST);
+			this.u32(value.length);
+			for (const item of value)
+				this.value(item, depth + 1);
+		} else if (typeof value.toJSON === 'function') {
+			this.value(value.toJSON(), depth + 1);
+		} else {
+			const keys = Object.keys(value);
+			this.u8(WKMessageEncoder.MAP);
+			this.u32(keys.length);
+			for (const key of keys) {
+				this.value(key, depth + 1);
+				this.value(value[key], depth + 1);
+			}
+		}
+	}
+
+	encode(messages) {
+		this.reserve(9);
+		this.bytes.set([0x57, 0x4b, 0x4d], 0); // WKM
+		this.offset = 3;
+		this.u8(WKMessageEncoder.version);
+		this.u8(0);
+		this.u32(messages.length);
+		for (const message of messages)
+			this.value(message);
+		return this.buffer.slice(0, this.offset);
+	}
+}
+
+WKMessageEncoder.version = 1;
+WKMessageEncoder.maxDepth = 64;
+WKMessageEncoder.NONE = 0x4e;
+WKMessageEncoder.TRUE = 0x54;
+WKMessageEncoder.FALSE = 0x46;
+WKMessageEncoder.INT = 0x69;
+WKMessageEncoder.FLOAT = 0x64;
+WKMessageEncoder.STR = 0x73;
+WKMessageEncoder.BYTES = 0x62;
+WKMessageEncoder.LIST = 0x6c;
+WKMessageEncoder.MAP = 0x6d;
+WKMessageEncoder.TYPED_ARRAY = 0x61;
+WKMessageEncoder.typedArrays = {
+	Int8Array: 1, Uint8Array: 2, Uint8ClampedArray: 2, Int16Array: 3, Uint16Array: 4,
+	Int32Array: 5, Uint32Array: 6, Float32Array: 7, Float64Array: 8,
+	BigInt64Array: 9, BigUint64Array: 10,
+};
+
 class WKApp {
 	constructor() {
+		// 'binary' batches messages into one WKMessage frame per animation frame,
+		// falling back to 'json' postMessage if the frame cannot be encoded or sent
+		this.channel = window.fetch ? 'binary' : 'json';
+		this.messageUrl = '/_wkapp/message';
+		this.queue = [];
+		this.scheduled = false;
+		// app.call promises awaiting results from python
+		this.calls = new Map();
+		this.callQueue = [];
+		this.callId = 0;
+		this.maxCalls = 16;
+		this.callTimeout = 30000;
 	}
-		
+
 	postHandler(handler, args = [], kwargs = {})
+	{
+		if (this.channel === 'binary') {
+			this.queue.push({
+				handler: handler,
+				href: window.location.href,
+				args: args,
+				kwargs: kwargs,
+			});
+			this.schedule();
+			return;
+		}
+		this.postJSON(handler, args, kwargs);
+	}
+
+	postJSON(handler, args = [], kwargs = {})
 	{
 		const message = JSON.stringify({
 		  href: window.location.href,
@@ -11,13 +163,96 @@ class WKApp {
 		});
 		window.webkit.messageHandlers[handler].postMessage(message);
 	}
-	
+
+	schedule() {
+		if (this.scheduled)
+			return;
+		this.scheduled = true;
+		if (document.hidden || !window.requestAnimationFrame)
+			setTimeout(() => this.flush(), 0);
+		else
+			requestAnimationFrame(() => this.flush());
+	}
+
+	flush() {
+		const messages = this.queue;
+		this.queue = [];
+		this.scheduled = false;
+		if (messages.length === 0)
+			return;
+		const fallback = (error) => {
+			console.warn(`WKApp binary channel unavailable, using JSON messages: ${error}`);
+			this.channel = 'json';
+			for (const message of messages)
+				this.postJSON(message.handler, message.args, message.kwargs);
+		};
+		let body;
+		try {
+			body = new WKMessageEncoder().encode(messages);
+		} catch (error) {
+			fallback(error);
+			return;
+		}
+		// only a failed request falls back, an error status means python received the frame and
+		// rejected it, resending the messages as JSON could dispatch them twice
+		fetch(this.messageUrl, {
+			method: 'POST',
+			body: body,
+			headers: {'Content-Type': 'application/x-wkapp-message'},
+		}).then((response) => {
+			if (!response.ok)
+				console.error(`WKApp messages rejected: HTTP ${response.status}`);
+		}, fallback);
+	}
+
 	invoke(context, target, args = [], kwargs = {})
 	{
 		var type = context.constructor.name;
-		this.postHandler('invoke', [type, context, target, args, kwargs]);
+		this.postHandler('invoke', [type, {}, target, args, kwargs]);
 	}
-	
+
+	call(context, target, args = [], kwargs = {}, timeout = this.callTimeout)
+	{
+		var type = context.constructor.name;
+		return new Promise((resolve, reject) => {
+			const start = () => {
+				const id = ++this.callId;
+				const timer = setTimeout(() => {
+					if (this.calls.delete(id)) {
+						reject(new Error(`WKApp call '${target}' timed out after ${timeout}ms`));
+						this.startCalls();
+					}
+				}, timeout);
+				this.calls.set(id, {resolve: resolve, reject: reject, timer: timer});
+				this.postHandler('call', [id, type, {}, target, args, kwargs]);
+			};
+			if (this.calls.size < this.maxCalls)
+				start();
+			else
+				this.callQueue.push(start);
+		});
+	}
+
+	resolveCalls(results) {
+		for (const [id, ok, value] of results) {
+			const call = this.calls.get(id);
+			if (call === undefined)
+				continue;
+			this.calls.delete(id);
+			clearTimeout(call.timer);
+			if (ok)
+				call.resolve(value);
+			else
+				call.reject(new Error(value));
+		}
+		this.startCalls();
+	}
+
+	startCalls() {
+		while (this.callQueue.length > 0 && this.calls.size < this.maxCalls)
+			this.callQueue.shift()();
+	}
+
 	exit() {
 		this.invoke(this,'exit');
 	}
@@ -27,10 +262,14 @@ class WKView {
 	constructor(app) {
 		this.app = app;
 	}
-	
+
 	invoke(name, ...args) {
 		this.app.invoke(this, name, args)
 	}
+
+	call(name, ...args) {
+		return this.app.call(this, name, args)
+	}
 }
 
 app = new WKApp();
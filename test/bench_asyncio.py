@@ -0,0 +1,120 @@
+'''
+Compares wkapp:// scheme latency of the thread model with WKApp(use_asyncio=True) under
+many concurrent asset loads. Each page load requests one view, whose coroutine on_GET
+awaits simulated I/O, plus a number of static assets, all through _urlSchemeTaskPool
+with fake tasks as the webview would issue them. Scheme tasks run on the pool's threads in
+both modes, the difference is where coroutine view events run: a private loop per event
+in the thread model, the shared app loop in asyncio mode.
+
+	python test/bench_asyncio.py --pages 50 --assets 30 --work 0.005
+'''
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stubs
+
+stubs.install()
+
+from bench_scheme_pool import percentile
+from fakes import FakeRequest, FakeTask
+from WKApp import WKApp
+from WKWebView import WKWebView
+
+view_source = '''<%!
+import asyncio
+import os
+
+work = float(os.environ.get('WKAPP_BENCH_WORK', '0.005'))
+
+class BenchView:
+
+	async def on_GET(self, request, values, query):
+		await asyncio.sleep(work)
+		self.loaded = await asyncio.get_running_loop().run_in_executor(None, len, query)
+
+view_class = BenchView
+%>
+<html><body>${view.path}</body></html>
+'''
+
+
+def create_app_root(assets, size):
+	root = tempfile.mkdtemp(prefix='wkapp-bench-')
+	os.makedirs(os.path.join(root, 'views'))
+	os.makedirs(os.path.join(root, 'static'))
+	with open(os.path.join(root, 'views', 'bench.html'), 'w') as view_file:
+		view_file.write(view_source)
+	for i in range(assets):
+		with open(os.path.join(root, 'static', f'asset{i}.js'), 'w') as asset_file:
+			asset_file.write(f'// asset {i}\n' + 'x' * size)
+	return root
+
+
+def run(root, use_asyncio, pages, assets, workers):
+	app = WKApp(root, custom_scheme=True, use_asyncio=use_asyncio, scheme_workers=workers,
+	            static_precompress=False)
+	pool = WKWebView._urlSchemeTaskPool({'wkapp': lambda task: app.webview_scheme_wkapp(None, task)},
+	                                    min_workers=workers,
+	                                    max_workers=workers)
+	urls = []
+	for page in range(pages):
+		urls.append('wkapp://localhost/bench.html')
+		urls.extend(f'wkapp://localhost/static/asset{i}.js' for i in range(assets))
+	remaining = threading.Semaphore(0)
+	tasks = [FakeTask(lambda task: remaining.release()) for url in urls]
+	try:
+		started = time.perf_counter()
+		for i, (url, task) in enumerate(zip(urls, tasks)):
+			task.started = time.perf_counter()
+			pool.task_start(i, task, FakeRequest(url))
+		for task in tasks:
+			if not remaining.acquire(timeout=60):
+				raise TimeoutError(f'{"asyncio" if use_asyncio else "thread"} mode stalled')
+		elapsed = time.perf_counter() - started
+		while pool.tasks: # handlers return shortly after didFinish, let them before stopping the loop
+			time.sleep(0.001)
+	finally:
+		pool.stop()
+		app.cleanup()
+	latencies = [(task.finished - task.started) * 1000 for task in tasks]
+	return {
+	 'tasks': len(tasks),
+	 'elapsed': elapsed,
+	 'rate': len(tasks) / elapsed,
+	 'p50': percentile(latencies, 50),
+	 'p99': percentile(latencies, 99),
+	 'max': max(latencies),
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('--pages', type=int, default=50, help='page loads, all issued at once')
+	parser.add_argument('--assets', type=int, default=30, help='static assets per page')
+	parser.add_argument('--size', type=int, default=8192, help='asset size in bytes')
+	parser.add_argument('--workers', type=int, default=4, help='scheme workers')
+	parser.add_argument('--work', type=float, default=0.005, help='seconds awaited in each on_GET')
+	args = parser.parse_args()
+	os.environ['WKAPP_BENCH_WORK'] = str(args.work)
+	logging.disable(logging.WARNING)
+	root = create_app_root(args.assets, args.size)
+	try:
+		for use_asyncio in (False, True):
+			result = run(root, use_asyncio, args.pages, args.assets, args.workers)
+			print(f"{'asyncio' if use_asyncio else 'thread':8s} {result['tasks']} tasks in "
+			      f"{result['elapsed']:.3f}s ({result['rate']:.0f}/s) latency ms "
+			      f"p50 {result['p50']:.2f} p99 {result['p99']:.2f} max {result['max']:.2f}")
+	finally:
+		shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+	main()
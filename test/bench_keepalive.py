@@ -0,0 +1,135 @@
+'''
+Benchmark for proxied wkapp:// assets with the shared keep-alive requests.Session against
+a new connection per request, served by a local stand-in HTTP/1.1 server. Reports requests
+per second, latency and how many connections the server accepted.
+
+	python test/bench_keepalive.py --requests 2000 --workers 4
+'''
+import argparse
+import http.server
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stubs
+
+stubs.install()
+
+from bench_scheme_pool import percentile
+from fakes import FakeRequest, FakeTask
+from WKApp import WKApp
+from WKWebView import WKWebView
+
+
+class AssetServer(http.server.ThreadingHTTPServer):
+	daemon_threads = True
+
+	def __init__(self, size):
+		self.body = b'x' * size
+		self.connections = 0
+		self.lock = threading.Lock()
+		super().__init__(('127.0.0.1', 0), AssetHandler)
+
+
+class AssetHandler(http.server.BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+	# headers and body are separate writes, with nagle a reused connection waits on delayed acks
+	disable_nagle_algorithm = True
+
+	def setup(self):
+		super().setup()
+		with self.server.lock:
+			self.server.connections += 1
+
+	def do_GET(self):
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/javascript')
+		self.send_header('Content-Length', str(len(self.server.body)))
+		self.end_headers()
+		self.wfile.write(self.server.body)
+
+	def log_message(self, format, *args):
+		pass
+
+
+class ConnectionPerRequest:
+	# stands in for WKApp.session, a new connection for every request as requests.request opens
+
+	request = staticmethod(requests.request)
+
+	def close(self):
+		pass
+
+
+def run(root, server, keep_alive, count, workers, assets):
+	app = WKApp(root, custom_scheme=True, proxy_cache=False, scheme_workers=workers,
+	            static_index=False)
+	if not keep_alive:
+		app._session = ConnectionPerRequest()
+	pool = WKWebView._urlSchemeTaskPool({'wkapp': lambda task: app.webview_scheme_wkapp(None, task)},
+	                                    min_workers=workers,
+	                                    max_workers=workers)
+	origin = f'http://127.0.0.1:{server.server_address[1]}'
+	remaining = threading.Semaphore(0)
+	tasks = [FakeTask(lambda task: remaining.release()) for i in range(count)]
+	connections = server.connections
+	try:
+		started = time.perf_counter()
+		for i, task in enumerate(tasks):
+			url = 'wkapp://proxy/' + quote(f'{origin}/asset{i % assets}.js', safe='')
+			task.started = time.perf_counter()
+			pool.task_start(i, task, FakeRequest(url))
+		for task in tasks:
+			if not remaining.acquire(timeout=60):
+				raise TimeoutError('proxied requests stalled')
+		elapsed = time.perf_counter() - started
+		while pool.tasks:
+			time.sleep(0.001)
+	finally:
+		pool.stop()
+		app.cleanup()
+	latencies = [(task.finished - task.started) * 1000 for task in tasks]
+	return {
+	 'requests': count,
+	 'elapsed': elapsed,
+	 'rate': count / elapsed,
+	 'p50': percentile(latencies, 50),
+	 'p99': percentile(latencies, 99),
+	 'connections': server.connections - connections,
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('--requests', type=int, default=2000)
+	parser.add_argument('--assets', type=int, default=30, help='distinct asset urls')
+	parser.add_argument('--size', type=int, default=2048, help='asset size in bytes')
+	parser.add_argument('--workers', type=int, default=4, help='scheme workers')
+	args = parser.parse_args()
+	logging.disable(logging.WARNING)
+	server = AssetServer(args.size)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	root = tempfile.mkdtemp(prefix='wkapp-bench-')
+	try:
+		for keep_alive in (False, True):
+			result = run(root, server, keep_alive, args.requests, args.workers, args.assets)
+			print(f"{'keep-alive' if keep_alive else 'per-request':12s} {result['requests']} requests "
+			      f"in {result['elapsed']:.3f}s ({result['rate']:.0f}/s) over "
+			      f"{result['connections']} connections, latency ms p50 {result['p50']:.2f} "
+			      f"p99 {result['p99']:.2f}")
+	finally:
+		server.shutdown()
+		shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,92 @@
+'''
+Benchmark for WKWebView._urlSchemeTaskPool, pushes fake WKURLSchemeTask objects through
+the pool and reports p50/p99 latency from task_start to didFinish.
+
+	python test/bench_scheme_pool.py --tasks 3000 --workers 4 --work 0.001
+'''
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stubs
+
+stubs.install()
+
+from fakes import FakeRequest, FakeTask
+from WKWebView import WKWebView
+
+
+def percentile(values, p):
+	values = sorted(values)
+	index = min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))
+	return values[index]
+
+
+def run(tasks, workers, warm, idle_timeout, work, size, burst):
+	body = b'x' * size
+	remaining = threading.Semaphore(0)
+	finished = []
+
+	def handler(task):
+		if work > 0:
+			time.sleep(work)
+		task.receive(data=body, content_type='application/octet-stream')
+		task.finish()
+
+	def done(task):
+		finished.append(task)
+		remaining.release()
+
+	pool = WKWebView._urlSchemeTaskPool({'app': handler},
+	                                    min_workers=warm,
+	                                    max_workers=workers,
+	                                    idle_timeout=idle_timeout)
+	fake_tasks = [FakeTask(done) for i in range(tasks)]
+	started = time.perf_counter()
+	for i, task in enumerate(fake_tasks):
+		task.started = time.perf_counter()
+		pool.task_start(i, task, FakeRequest(f'app://localhost/asset/{i}.js'))
+		if burst and (i + 1) % burst == 0:
+			for j in range(burst):
+				remaining.acquire()
+	for i in range(tasks - (tasks // burst * burst if burst else 0)):
+		remaining.acquire()
+	elapsed = time.perf_counter() - started
+	pool.stop()
+	latencies = [(task.finished - task.started) * 1000 for task in fake_tasks]
+	return {
+	 'tasks': tasks,
+	 'elapsed': elapsed,
+	 'rate': tasks / elapsed,
+	 'mean': statistics.mean(latencies),
+	 'p50': percentile(latencies, 50),
+	 'p99': percentile(latencies, 99),
+	 'max': max(latencies),
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('--tasks', type=int, default=3000)
+	parser.add_argument('--workers', type=int, default=4, help='maximum pool workers')
+	parser.add_argument('--warm', type=int, default=1, help='warm core workers')
+	parser.add_argument('--idle-timeout', type=float, default=5.0)
+	parser.add_argument('--work', type=float, default=0.0, help='seconds spent in each handler')
+	parser.add_argument('--size', type=int, default=4096, help='response body bytes')
+	parser.add_argument('--burst', type=int, default=0,
+	                    help='wait for each burst of this many tasks to finish, 0 queues all at once')
+	args = parser.parse_args()
+	result = run(args.tasks, args.workers, args.warm, args.idle_timeout, args.work, args.size,
+	             args.burst)
+	print(f"{result['tasks']} tasks in {result['elapsed']:.3f}s ({result['rate']:.0f}/s) "
+	      f"latency ms mean {result['mean']:.2f} p50 {result['p50']:.2f} "
+	      f"p99 {result['p99']:.2f} max {result['max']:.2f}")
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,134 @@
+'''
+Load test for the WKApp server backends, measures requests per second and tail latency of
+page and static asset GETs from concurrent clients on localhost.
+
+	python test/bench_server.py --backends threaded wsgiref --clients 30 --requests 3000
+'''
+import argparse
+import http.client
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stubs
+
+stubs.install()
+
+from bench_scheme_pool import percentile
+from WKApp import WKApp
+
+view_source = '''<%!
+class BenchView:
+
+	def on_GET(self, request, values, query):
+		self.query = query
+
+view_class = BenchView
+%>
+<html><body>${view.path}</body></html>
+'''
+
+
+def create_app_root(assets, size):
+	root = tempfile.mkdtemp(prefix='wkapp-bench-')
+	os.makedirs(os.path.join(root, 'views'))
+	os.makedirs(os.path.join(root, 'static'))
+	with open(os.path.join(root, 'views', 'bench.html'), 'w') as view_file:
+		view_file.write(view_source)
+	for i in range(assets):
+		with open(os.path.join(root, 'static', f'asset{i}.js'), 'w') as asset_file:
+			asset_file.write(f'// asset {i}\n' + 'x' * size)
+	return root
+
+
+def run(root, backend, port, clients, requests, assets, workers):
+	app = WKApp(root, port=port, server_backend=backend, server_workers=workers,
+	            static_precompress=False)
+	# a page load is one view followed by its assets, as a webview requests them
+	paths = ['/bench.html'] + [f'/static/asset{i}.js' for i in range(assets)]
+	latencies = []
+	errors = []
+	lock = threading.Lock()
+	counter = iter(range(requests))
+
+	def client():
+		while True:
+			with lock:
+				i = next(counter, None)
+			if i is None:
+				return
+			path = paths[i % len(paths)]
+			start = time.perf_counter()
+			try:
+				connection = http.client.HTTPConnection(app.host, app.port, timeout=30)
+				connection.request('GET', path)
+				response = connection.getresponse()
+				response.read()
+				connection.close()
+				if response.status != 200:
+					raise Exception(f'HTTP {response.status} for {path}')
+			except Exception as e:
+				with lock:
+					errors.append(e)
+				continue
+			elapsed = time.perf_counter() - start
+			with lock:
+				latencies.append(elapsed * 1000)
+
+	app.start_server()
+	try:
+		threads = [threading.Thread(target=client) for i in range(clients)]
+		started = time.perf_counter()
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		elapsed = time.perf_counter() - started
+	finally:
+		app.cleanup()
+	return {
+	 'requests': len(latencies),
+	 'errors': len(errors),
+	 'elapsed': elapsed,
+	 'rate': len(latencies) / elapsed,
+	 'mean': statistics.mean(latencies) if latencies else 0.0,
+	 'p50': percentile(latencies, 50) if latencies else 0.0,
+	 'p99': percentile(latencies, 99) if latencies else 0.0,
+	 'max': max(latencies) if latencies else 0.0,
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('--backends', nargs='+', default=['threaded', 'wsgiref'],
+	                    help='WKApp server_backend names, including bottle.server_names')
+	parser.add_argument('--clients', type=int, default=30, help='concurrent client threads')
+	parser.add_argument('--requests', type=int, default=3000)
+	parser.add_argument('--assets', type=int, default=30, help='static assets per page')
+	parser.add_argument('--size', type=int, default=8192, help='asset size in bytes')
+	parser.add_argument('--workers', type=int, default=16, help='threaded backend workers')
+	parser.add_argument('--port', type=int, default=18080)
+	args = parser.parse_args()
+	logging.disable(logging.WARNING)
+	root = create_app_root(args.assets, args.size)
+	try:
+		for backend in args.backends:
+			result = run(root, backend, args.port, args.clients, args.requests, args.assets,
+			             args.workers)
+			print(f"{backend:10s} {result['requests']} requests in {result['elapsed']:.3f}s "
+			      f"({result['rate']:.0f}/s, {result['errors']} errors) latency ms "
+			      f"mean {result['mean']:.2f} p50 {result['p50']:.2f} p99 {result['p99']:.2f} "
+			      f"max {result['max']:.2f}")
+	finally:
+		shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+	main()
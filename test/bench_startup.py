@@ -0,0 +1,77 @@
+'''
+Startup benchmark comparing cold template loads (empty views-cache, every template compiled
+by Mako) with warm loads (compiled modules reused from views-cache). Each start runs in a
+fresh interpreter so no module or import state carries over.
+
+	python test/bench_startup.py --runs 5
+'''
+import argparse
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+
+def start(root):
+	# one timed start in this process: WKApp construction plus compiling or loading every template
+	sys.path.insert(0, here)
+	import stubs
+	stubs.install()
+	logging.disable(logging.WARNING)
+	started = time.perf_counter()
+	from WKApp import WKApp
+	imported = time.perf_counter()
+	app = WKApp(root, static_index=False)
+	app.warmup(instantiate=False)
+	finished = time.perf_counter()
+	stats = app.template_stats
+	app.cleanup()
+	print(json.dumps({
+	 'import': imported - started,
+	 'startup': finished - imported,
+	 'compiles': stats['compiles'],
+	 'module_loads': stats['module_loads'],
+	}))
+
+
+def run(root, cold):
+	if cold:
+		shutil.rmtree(os.path.join(root, 'views-cache'), ignore_errors=True)
+	output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', root],
+	                        check=True, capture_output=True, text=True).stdout
+	return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('--runs', type=int, default=5, help='starts measured for each mode')
+	parser.add_argument('--views', default=os.path.join(here, 'views'),
+	                    help='views directory of the app to start')
+	parser.add_argument('--child', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.child:
+		return start(args.child)
+	root = tempfile.mkdtemp(prefix='wkapp-bench-')
+	try:
+		shutil.copytree(args.views, os.path.join(root, 'views'))
+		for cold in (True, False):
+			if not cold:
+				run(root, False) # make sure every module is cached
+			results = [run(root, cold) for i in range(args.runs)]
+			startup = [result['startup'] * 1000 for result in results]
+			print(f"{'cold' if cold else 'warm':5s} startup ms median {statistics.median(startup):.1f} "
+			      f"min {min(startup):.1f} max {max(startup):.1f}, "
+			      f"{results[-1]['compiles']} compiles, {results[-1]['module_loads']} cached module loads")
+	finally:
+		shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+	main()
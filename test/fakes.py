@@ -0,0 +1,125 @@
+'''
+Fake WKURLSchemeTask, NSURLRequest and NSURL objects for driving _urlSchemeTaskPool and
+_urlSchemeTask off device.
+'''
+import json
+import time
+
+
+class FakeString:
+
+	def __init__(self, value):
+		self.value = value
+
+	def __str__(self):
+		return self.value
+
+
+class FakeURL:
+
+	def __init__(self, url):
+		self.url = url
+		self.scheme_, rest = url.split('://', 1)
+		self.host_, _, path = rest.partition('/')
+		self.path_ = '/' + path
+
+	def absoluteString(self):
+		return FakeString(self.url)
+
+	def relativeString(self):
+		return FakeString(self.url)
+
+	def scheme(self):
+		return FakeString(self.scheme_)
+
+	def host(self):
+		return FakeString(self.host_)
+
+	def path(self):
+		return FakeString(self.path_)
+
+	def port(self):
+		return None
+
+	def query(self):
+		return None
+
+	def user(self):
+		return None
+
+	def password(self):
+		return None
+
+
+class FakeHeaders(dict):
+
+	def allKeys(self):
+		return list(self.keys())
+
+
+class FakeRequest:
+
+	def __init__(self, url):
+		self.url = FakeURL(url)
+
+	def HTTPMethod(self):
+		return FakeString('GET')
+
+	def URL(self):
+		return self.url
+
+	def allHTTPHeaderFields(self):
+		return FakeHeaders({'Accept': '*/*'})
+
+	def HTTPBody(self):
+		return None
+
+
+class FakeTask:
+	# records what the pool hands to webkit, done(task) is called from didFinish
+
+	def __init__(self, done=None):
+		self.done = done
+		self.started = 0.0
+		self.finished = 0.0
+		self.responses = []
+		self.chunks = []
+
+	def didReceiveResponse(self, response):
+		self.responses.append(response)
+
+	def didReceiveData(self, data):
+		self.chunks.append(len(data))
+
+	def didFinish(self):
+		self.finished = time.perf_counter()
+		if not self.done is None:
+			self.done(self)
+
+
+class FakeWebView:
+	# counts evaluate calls, a batch script is answered with one result per batched snippet
+
+	def __init__(self, result=None):
+		self.scripts = []
+		self.result = result
+
+	@property
+	def evaluations(self):
+		return len(self.scripts)
+
+	def eval_js(self, script):
+		self.scripts.append(script)
+		count = script.count('r.push(v(')
+		if count:
+			return json.dumps([self.result] * count)
+		return self.result
+
+	def eval_js_async(self, script):
+		self.scripts.append(script)
+
+
+class FakeApp:
+
+	def __init__(self, webview):
+		self.app_webview = webview
@@ -0,0 +1,55 @@
+'''
+Stand-ins for the Pythonista only ui, objc_util and console modules, so the pure Python
+parts of WKApp (dispatcher, scheme task pool, message codec, server) can be tested and
+benchmarked off device. Real modules are used when they can be imported.
+'''
+import ctypes
+import os
+import sys
+import types
+from unittest import mock
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def objc_util_stub():
+	module = types.ModuleType('objc_util')
+	for name in dir(ctypes):
+		if not name.startswith('__'):
+			setattr(module, name, getattr(ctypes, name))
+	for name in ('ObjCClass', 'ObjCInstance', 'ObjCBlock', 'UIApplication', 'NSObject', 'NSURL'):
+		setattr(module, name, mock.MagicMock())
+	module.create_objc_class = lambda *args, **kwargs: mock.MagicMock()
+	module.retain_global = lambda obj: None
+	module.on_main_thread = lambda func: func
+	module.nsurl = lambda url: url
+	module.ns = lambda obj: obj
+	module.nsdata_to_bytes = lambda data: bytes(data)
+	return module
+
+
+def ui_stub():
+	module = types.ModuleType('ui')
+
+	class View:
+
+		def __init__(self, *args, **kwargs):
+			pass
+
+		def close(self):
+			pass
+
+	module.View = View
+	module.in_background = lambda func: func
+	module.load_view = mock.MagicMock()
+	return module
+
+
+def install():
+	if not root in sys.path:
+		sys.path.insert(0, root)
+	for name, stub in (('objc_util', objc_util_stub), ('ui', ui_stub), ('console', types.ModuleType)):
+		try:
+			__import__(name)
+		except ImportError:
+			sys.modules[name] = stub() if stub is not types.ModuleType else stub(name)
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from fakes import FakeApp, FakeWebView
+from WKApp import WKJavascript, WKView
+
+
+@pytest.fixture
+def webview():
+	return FakeWebView()
+
+
+@pytest.fixture
+def view(webview):
+	return WKView(app=FakeApp(webview))
+
+
+def test_unbatched_updates_evaluate_each(view, webview):
+	for i in range(10):
+		view.element(f'item{i}').set('text', str(i))
+	assert webview.evaluations == 10
+
+
+def test_batched_updates_evaluate_once(view, webview):
+	with view.batch(max_scripts=500, max_delay=60) as batch:
+		for i in range(200):
+			view.element(f'item{i}').set('text', str(i))
+		assert webview.evaluations == 0
+	assert webview.evaluations == 1
+	assert batch.flushes == 1
+	assert webview.scripts[0].count('r.push(v(') == 200
+
+
+def test_flush_by_script_count(view, webview):
+	with view.batch(max_scripts=100, max_delay=60):
+		for i in range(250):
+			view.element(f'item{i}').set('text', str(i))
+	assert webview.evaluations == 3
+
+
+def test_flush_by_size(view, webview):
+	with view.batch(max_size=1024, max_delay=60):
+		for i in range(10):
+			view.eval_js(f'window.x{i} = "{"y" * 300}"')
+	# flushed once 4 scripts pass 1024 bytes, twice, then the remaining 2 on exit
+	assert webview.evaluations == 3
+
+
+def test_get_flushes_pending_updates(view):
+	webview = FakeWebView(result='value')
+	view = WKView(app=FakeApp(webview))
+	with view.batch(max_delay=60):
+		view.element('a').set('text', 'x')
+		view.element('b').set('text', 'y')
+		assert view.element('c').get('text') == 'value'
+		assert webview.evaluations == 1
+		view.element('d').set('text', 'z')
+	assert webview.evaluations == 2
+
+
+def test_nested_batches_restore_parent(view, webview):
+	with view.batch(max_delay=60) as outer:
+		with view.batch(max_delay=60) as inner:
+			assert view.batching is inner
+		assert view.batching is outer
+	assert view.batching is None
+
+
+def test_batch_script_returns_one_result_per_snippet():
+	script = WKJavascript.batch(['1', 'var q = 1; q + 1;'])
+	assert script.count('r.push(v(') == 2
+	assert json.dumps('var q = 1; q + 1;') in script
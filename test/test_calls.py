@@ -0,0 +1,91 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from fakes import FakeWebView
+from WKApp import WKApp
+
+
+class CallsApp(WKApp):
+
+	async def add(self, a, b):
+		await asyncio.sleep(0)
+		return a + b
+
+	async def slow(self):
+		await asyncio.sleep(10)
+
+	async def wait(self, event):
+		await asyncio.get_running_loop().run_in_executor(None, event.wait)
+
+
+class Dispatcher:
+
+	def dispatch_priority(self, priority, func, *args):
+		func(*args)
+
+
+class Sender(FakeWebView):
+
+	current_url = 'wkapp://app/'
+
+	def __init__(self):
+		super().__init__()
+		self.dispatcher = Dispatcher()
+
+	def resolved(self, timeout=5):
+		deadline = time.monotonic() + timeout
+		while not self.scripts and time.monotonic() < deadline:
+			time.sleep(0.01)
+		results = []
+		for script in self.scripts:
+			results.extend(json.loads(script[len('app.resolveCalls('):-len(');')]))
+		return results
+
+
+@pytest.fixture(params=[False, True], ids=['thread', 'asyncio'])
+def app(request, tmp_path):
+	app = CallsApp(str(tmp_path), static_index=False, use_asyncio=request.param, scheme_workers=2)
+	yield app
+	app.cleanup()
+
+
+def test_call_resolves_result(app):
+	sender = Sender()
+	app.webview_on_call(sender, 1, 'WKApp', None, 'add', [1, 2], {})
+	assert sender.resolved() == [[1, True, 3]]
+
+
+def test_call_timeout_rejects_promise(app):
+	app.calls.timeout = 0.05
+	sender = Sender()
+	started = time.monotonic()
+	app.webview_on_call(sender, 1, 'WKApp', None, 'slow', [], {})
+	# the dispatcher thread is not held while the coroutine runs
+	assert time.monotonic() - started < 1
+	[[id, ok, error]] = sender.resolved()
+	assert (id, ok) == (1, False)
+	assert error.startswith('TimeoutError: ')
+
+
+def test_run_coroutine_timeout(app):
+	with pytest.raises(TimeoutError):
+		app.run_coroutine(asyncio.sleep(10), timeout=0.05)
+
+
+def test_thread_mode_fire_and_forget_is_bounded(tmp_path):
+	app = CallsApp(str(tmp_path), static_index=False, scheme_workers=2)
+	event = threading.Event()
+	try:
+		futures = [app.run_coroutine(app.wait(event), wait=False) for i in range(6)]
+		time.sleep(0.1)
+		assert sum(future.running() for future in futures) == 2
+		event.set()
+		for future in futures:
+			future.result(5)
+	finally:
+		event.set()
+		app.cleanup()
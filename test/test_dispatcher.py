@@ -0,0 +1,117 @@
+import threading
+
+from WKWebView import WKWebView
+
+Dispatcher = WKWebView._webviewDispatcher
+
+
+def run_queued(dispatcher, drain=True):
+	# queue everything, including the stop sentinel, before the thread starts so the
+	# order is deterministic
+	dispatcher.stop(join=False, drain=drain)
+	dispatcher.start()
+	dispatcher.join(5)
+	assert not dispatcher.is_alive()
+
+
+def test_priority_order():
+	calls = []
+	dispatcher = Dispatcher()
+	dispatcher.dispatch_priority(Dispatcher.PRIORITY_MESSAGE, calls.append, 'message')
+	dispatcher.dispatch(calls.append, 'default')
+	dispatcher.dispatch_priority(Dispatcher.PRIORITY_NAVIGATION, calls.append, 'navigation')
+	dispatcher.dispatch(calls.append, 'default-2')
+	run_queued(dispatcher)
+	assert calls == ['navigation', 'default', 'default-2', 'message']
+
+
+def test_invoke_calls_instance_and_delegate():
+	calls = []
+
+	class Delegate:
+
+		def webview_did_finish_load(self, instance, url):
+			calls.append(('delegate', instance, url))
+
+	class Instance:
+		delegate = Delegate()
+
+		def webview_did_finish_load(self, url):
+			calls.append(('instance', url))
+
+	instance = Instance()
+	dispatcher = Dispatcher()
+	dispatcher.invoke(instance, 'webview_did_finish_load', 'about:blank')
+	dispatcher.invoke(instance, 'webview_missing', 'about:blank')
+	run_queued(dispatcher)
+	assert calls == [('instance', 'about:blank'), ('delegate', instance, 'about:blank')]
+
+
+def test_stop_drain_processes_queued_messages():
+	calls = []
+	dispatcher = Dispatcher()
+	for i in range(5):
+		dispatcher.dispatch(calls.append, i)
+	run_queued(dispatcher, drain=True)
+	assert calls == [0, 1, 2, 3, 4]
+	assert dispatcher.depth == 0
+	assert not dispatcher.running
+
+
+def test_stop_without_drain_skips_queued_messages():
+	calls = []
+	dispatcher = Dispatcher()
+	for i in range(5):
+		dispatcher.dispatch(calls.append, i)
+	run_queued(dispatcher, drain=False)
+	assert calls == []
+	assert dispatcher.depth == 5
+
+
+def test_stop_from_a_running_thread():
+	started = threading.Event()
+	release = threading.Event()
+	calls = []
+	dispatcher = Dispatcher()
+	dispatcher.start()
+	dispatcher.dispatch(lambda: (started.set(), release.wait(5)))
+	dispatcher.dispatch(calls.append, 'after')
+	assert started.wait(5)
+	dispatcher.stop(join=False, drain=True)
+	release.set()
+	dispatcher.join(5)
+	assert not dispatcher.is_alive()
+	assert calls == ['after']
+
+
+def test_stats_counters():
+
+	def fail():
+		raise ValueError('boom')
+
+	dispatcher = Dispatcher()
+	dispatcher.dispatch(lambda: None)
+	dispatcher.dispatch(fail)
+	dispatcher.dispatch_priority(Dispatcher.PRIORITY_MESSAGE, lambda: None)
+	run_queued(dispatcher)
+	stats = dispatcher.stats
+	assert stats['dispatched'] == 3
+	assert stats['processed'] == 3
+	assert stats['errors'] == 1
+	assert stats['max_depth'] == 3
+	assert stats['max_wait_time'] >= 0.0
+	assert stats['wait_time'] >= stats['max_wait_time']
+
+
+def test_no_messages_accepted_after_stop():
+	calls = []
+	dispatcher = Dispatcher()
+	dispatcher.dispatch(calls.append, 'queued')
+	dispatcher.stop(join=False, drain=True)
+	dispatcher.dispatch_priority(Dispatcher.PRIORITY_NAVIGATION, calls.append, 'navigation')
+	dispatcher.invoke(calls, 'append', 'invoked')
+	dispatcher.start()
+	dispatcher.join(5)
+	assert calls == ['queued']
+	assert dispatcher.stats['rejected'] == 2
+	assert dispatcher.stats['dispatched'] == 1
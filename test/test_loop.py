@@ -0,0 +1,65 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from WKApp import WKAppLoop
+
+
+@pytest.fixture
+def loop():
+	loop = WKAppLoop(workers=2)
+	loop.start()
+	yield loop
+	loop.stop()
+
+
+def test_run_coroutine(loop):
+
+	async def add(a, b):
+		await asyncio.sleep(0)
+		return a + b
+
+	assert loop.run_coroutine(add(1, 2), timeout=5) == 3
+
+
+def test_run_coroutine_on_loop_thread_raises(loop):
+
+	async def nested():
+		coro = asyncio.sleep(0)
+		try:
+			loop.run_coroutine(coro)
+		finally:
+			coro.close()
+
+	with pytest.raises(RuntimeError):
+		loop.run_coroutine(nested(), timeout=5)
+
+
+def test_scheme_handlers_awaiting_default_executor(loop):
+	# scheme handlers run on pool threads and block on coroutine view events which use the
+	# default executor, more concurrent handlers than default executor threads must not deadlock
+
+	async def on_GET(i):
+		return await asyncio.get_running_loop().run_in_executor(None, lambda: i * 2)
+
+	def handler(i):
+		return loop.run_coroutine(on_GET(i), timeout=5)
+
+	with ThreadPoolExecutor(max_workers=8) as scheme_pool:
+		results = list(scheme_pool.map(handler, range(16)))
+	assert results == [i * 2 for i in range(16)]
+
+
+def test_spawn_is_bounded(loop):
+	loop.pending = type(loop.pending)(1)
+	results = []
+
+	async def work(i):
+		await asyncio.sleep(0.01)
+		results.append(i)
+
+	futures = [loop.spawn(work(i)) for i in range(3)]
+	for future in futures:
+		future.result(5)
+	assert results == [0, 1, 2]
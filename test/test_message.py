@@ -0,0 +1,157 @@
+import array
+import io
+import struct
+
+import pytest
+
+from WKMessage import WKMessageCodec, WKMessageError
+
+
+def frame(*values, count=None):
+	out = bytearray(WKMessageCodec.header.pack(WKMessageCodec.magic, WKMessageCodec.version, 0,
+	                                           len(values) if count is None else count))
+	for value in values:
+		out += value
+	return bytes(out)
+
+
+@pytest.mark.parametrize('value', [
+ None, True, False, 0, -1, 2**63 - 1, -2**63, 1.5, float('inf'), '', 'text', 'ünïcødé ✓',
+ b'', b'\x00\xffbytes', [], [1, [2, [3]]], {}, {'a': 1, 'b': {'c': [None, 'd']}},
+])
+def test_round_trip(value):
+	assert WKMessageCodec.decode(WKMessageCodec.encode([value])) == [value]
+
+
+@pytest.mark.parametrize('typecode', sorted(WKMessageCodec.typecodes))
+def test_typed_array_round_trip(typecode):
+	value = array.array(typecode, [0, 1, 2, 3])
+	decoded = WKMessageCodec.decode(WKMessageCodec.encode([value]))[0]
+	assert decoded.typecode == typecode
+	assert decoded == value
+
+
+def test_batch_round_trip():
+	messages = [{'handler': 'invoke', 'args': ['View', {}, 'target', [1, 2], {}], 'kwargs': {}}] * 3
+	assert WKMessageCodec.decode(WKMessageCodec.encode(messages)) == messages
+
+
+def test_encode_normalises_containers():
+	data = WKMessageCodec.encode([(1, 2), bytearray(b'ab'), memoryview(b'cd'), {1: 'one'}])
+	assert WKMessageCodec.decode(data) == [[1, 2], b'ab', b'cd', {'1': 'one'}]
+
+
+@pytest.mark.parametrize('value', [2**63, -2**63 - 1, object(), array.array('u', 'x')])
+def test_encode_rejects(value):
+	with pytest.raises(WKMessageError):
+		WKMessageCodec.encode([value])
+
+
+def test_encode_rejects_cyclic_values():
+	value = []
+	value.append(value)
+	with pytest.raises(WKMessageError):
+		WKMessageCodec.encode([value])
+
+
+def nested(depth):
+	return b'l\x01\x00\x00\x00' * depth + b'N'
+
+
+@pytest.mark.parametrize('data', [
+ b'',
+ b'WK',
+ b'XYZ\x01\x00\x00\x00\x00\x00',
+ b'WKM\x02\x00\x00\x00\x00\x00',
+ frame(count=1),
+ frame(b'N', b'N', count=1),
+ frame(b'?'),
+ frame(b'i\x01\x02'),
+ frame(b'd\x00'),
+ frame(b's\x05\x00\x00\x00abc'),
+ frame(b's\x02\x00\x00\x00\xff\xfe'),
+ frame(b'a\x63\x00\x00\x00\x00'),
+ frame(b'a\x05\x03\x00\x00\x00abc'),
+ frame(b'l\xff\xff\xff\xff'),
+ frame(b'm\x01\x00\x00\x00' + b'l\x00\x00\x00\x00' + b'N'),
+ frame(b'm\x01\x00\x00\x00' + b'i' + struct.pack('<q', 1) + b'N'),
+ frame(nested(WKMessageCodec.max_depth + 1)),
+ frame(nested(100000)),
+])
+def test_decode_rejects_malformed_frames(data):
+	with pytest.raises(WKMessageError):
+		WKMessageCodec.decode(data)
+
+
+def test_decode_accepts_max_depth():
+	value = WKMessageCodec.decode(frame(nested(WKMessageCodec.max_depth)))[0]
+	for _ in range(WKMessageCodec.max_depth):
+		value = value[0]
+	assert value is None
+
+
+class MessageApp:
+
+	@pytest.fixture
+	def app(self, tmp_path):
+		from WKApp import WKApp
+
+		class App(WKApp):
+			received = []
+
+			def webview_on_ping(self, webview, *args, **kwargs):
+				self.received.append((args, kwargs))
+
+		return App(str(tmp_path))
+
+	@staticmethod
+	def post(app, body, content_type=WKMessageCodec.content_type, origin=None):
+		environ = {
+		 'REQUEST_METHOD': 'POST',
+		 'PATH_INFO': '/_wkapp/message',
+		 'SERVER_NAME': 'localhost',
+		 'SERVER_PORT': str(app.port),
+		 'CONTENT_LENGTH': str(len(body)),
+		 'wsgi.input': io.BytesIO(body),
+		 'wsgi.url_scheme': 'http',
+		}
+		if not content_type is None:
+			environ['CONTENT_TYPE'] = content_type
+		if not origin is None:
+			environ['HTTP_ORIGIN'] = origin
+		status = []
+		b''.join(app.app(environ, lambda s, headers, exc_info=None: status.append(s)))
+		return int(status[0].split(' ', 1)[0])
+
+
+class TestMessageRoute(MessageApp):
+
+	def ping(self, *args):
+		return WKMessageCodec.encode([{'handler': 'ping', 'args': list(args), 'kwargs': {}}])
+
+	def test_dispatches(self, app):
+		assert self.post(app, self.ping(1), origin=app.base_url) == 204
+		assert app.received == [((1,), {})]
+
+	def test_requires_content_type(self, app):
+		assert self.post(app, self.ping(1), content_type='text/plain') == 415
+		assert self.post(app, self.ping(1), content_type=None) == 415
+		assert app.received == []
+
+	def test_rejects_foreign_origin(self, app):
+		assert self.post(app, self.ping(1), origin='https://example.com') == 403
+		assert app.received == []
+
+	def test_unknown_handler_dispatches_nothing(self, app):
+		body = WKMessageCodec.encode([
+		 {'handler': 'ping', 'args': [1], 'kwargs': {}},
+		 {'handler': 'missing', 'args': [], 'kwargs': {}},
+		])
+		assert self.post(app, body) == 404
+		assert app.received == []
+
+	def test_invalid_message_dispatches_nothing(self, app):
+		body = WKMessageCodec.encode([{'handler': 'ping', 'args': [1], 'kwargs': {}}, ['not', 'a', 'map']])
+		assert self.post(app, body) == 400
+		assert self.post(app, b'WKM') == 400
+		assert app.received == []
@@ -0,0 +1,163 @@
+import itertools
+
+import pytest
+
+import WKApp as wkapp
+from fakes import FakeRequest, FakeTask
+from WKApp import WKAppProxyCache
+from WKWebView import WKWebView
+
+Pool = WKWebView._urlSchemeTaskPool
+
+
+@pytest.fixture
+def clock(monkeypatch):
+	# time.time advancing 10 seconds per call, so every access is ordered and past access_resolution
+	ticks = itertools.count(1_000_000, 10)
+	monkeypatch.setattr(wkapp.time, 'time', lambda: next(ticks))
+
+
+def store(cache, url, body, headers=None):
+	headers = {'Cache-Control': 'max-age=3600'} if headers is None else headers
+	list(cache.store(url, 200, headers, iter([body])))
+
+
+def read(cache, entry):
+	return b''.join(bytes(data) for data in cache.read(entry))
+
+
+def test_fresh_entry(tmp_path):
+	cache = WKAppProxyCache(str(tmp_path))
+	store(cache, 'https://cdn/a.js', b'alpha', {'Cache-Control': 'max-age=60', 'ETag': '"a"'})
+	entry = cache.lookup('https://cdn/a.js')
+	assert cache.is_fresh(entry)
+	assert entry['etag'] == '"a"'
+	assert read(cache, entry) == b'alpha'
+	assert WKAppProxyCache(str(tmp_path)).lookup('https://cdn/a.js')['digest'] == entry['digest']
+
+
+@pytest.mark.parametrize('headers', [
+ {'Cache-Control': 'no-cache'},
+ {'Cache-Control': 'max-age=0'},
+ {},
+])
+def test_stale_entry(tmp_path, headers):
+	cache = WKAppProxyCache(str(tmp_path))
+	store(cache, 'https://cdn/a.js', b'alpha', headers)
+	assert not cache.is_fresh(cache.lookup('https://cdn/a.js'))
+
+
+@pytest.mark.parametrize('method,status,headers,cacheable', [
+ ('GET', 200, {}, True),
+ ('POST', 200, {}, False),
+ ('GET', 404, {}, False),
+ ('GET', 200, {'Cache-Control': 'no-store'}, False),
+ ('GET', 200, {'Vary': '*'}, False),
+])
+def test_is_cacheable(tmp_path, method, status, headers, cacheable):
+	assert WKAppProxyCache(str(tmp_path)).is_cacheable(method, status, headers) == cacheable
+
+
+def test_incomplete_body_is_not_stored(tmp_path):
+	cache = WKAppProxyCache(str(tmp_path))
+	body = cache.store('https://cdn/a.js', 200, {}, iter([b'a', b'b']))
+	next(body)
+	body.close()
+	assert cache.lookup('https://cdn/a.js') is None
+
+
+def test_eviction_follows_access_order(tmp_path, clock):
+	cache = WKAppProxyCache(str(tmp_path), max_size=25)
+	store(cache, 'https://cdn/a.js', b'a' * 10)
+	store(cache, 'https://cdn/b.js', b'b' * 10)
+	cache.lookup('https://cdn/a.js')
+	store(cache, 'https://cdn/c.js', b'c' * 10)
+	assert cache.lookup('https://cdn/b.js') is None
+	assert not cache.lookup('https://cdn/a.js') is None
+	assert not cache.lookup('https://cdn/c.js') is None
+
+
+def test_access_times_survive_restart(tmp_path, clock):
+	cache = WKAppProxyCache(str(tmp_path), max_size=25)
+	store(cache, 'https://cdn/a.js', b'a' * 10)
+	store(cache, 'https://cdn/b.js', b'b' * 10)
+	cache.lookup('https://cdn/a.js')
+	cache.flush()
+	cache = WKAppProxyCache(str(tmp_path), max_size=25)
+	store(cache, 'https://cdn/c.js', b'c' * 10)
+	assert cache.lookup('https://cdn/b.js') is None
+	assert not cache.lookup('https://cdn/a.js') is None
+
+
+class FakeResponse:
+
+	def __init__(self, status_code, headers, body=b''):
+		self.status_code = status_code
+		self.headers = headers
+		self.body = body
+		self.closed = False
+
+	def iter_content(self, chunk_size):
+		for offset in range(0, len(self.body), chunk_size):
+			yield self.body[offset:offset + chunk_size]
+
+	def close(self):
+		self.closed = True
+
+
+class FakeSession:
+
+	def __init__(self, *responses):
+		self.responses = list(responses)
+		self.requests = []
+
+	def request(self, method, url, headers=None, **kwargs):
+		self.requests.append((method, url, dict(headers)))
+		return self.responses.pop(0)
+
+	def close(self):
+		pass
+
+
+@pytest.fixture
+def app(tmp_path):
+	app = wkapp.WKApp(str(tmp_path), static_index=False)
+	yield app
+	app.cleanup()
+
+
+def proxy(app, url):
+	pool = Pool({})
+	fake = FakeTask()
+	task = Pool._urlSchemeTask(pool, 1, fake, FakeRequest('wkapp://proxy/x'))
+	app.scheme_proxy(task, url, app.proxy_cache)
+	return fake
+
+
+def test_proxy_revalidates_stale_entry(app):
+	url = 'https://cdn/pyodide.js'
+	app._session = FakeSession(
+	 FakeResponse(200, {'Cache-Control': 'no-cache', 'ETag': '"v1"', 'Content-Length': '6'}, b'pyodid'),
+	 FakeResponse(304, {'Cache-Control': 'max-age=60', 'ETag': '"v1"'}),
+	)
+	assert sum(proxy(app, url).chunks) == 6
+	assert app.proxy_cache.misses == 1
+	fake = proxy(app, url)
+	assert sum(fake.chunks) == 6
+	assert app._session.requests[1][2]['If-None-Match'] == '"v1"'
+	assert app.proxy_cache.revalidated == 1
+	# fresh after the 304, served without a request
+	assert sum(proxy(app, url).chunks) == 6
+	assert len(app._session.requests) == 2
+	assert app.proxy_cache.hits == 1
+
+
+def test_proxy_offline_serves_stale_and_504s_misses(app):
+	url = 'https://cdn/wasmer.js'
+	app._session = FakeSession(FakeResponse(200, {'Cache-Control': 'no-cache'}, b'wasm'))
+	proxy(app, url)
+	app.proxy_cache.offline = True
+	assert sum(proxy(app, url).chunks) == 4
+	fake = proxy(app, 'https://cdn/missing.js')
+	assert fake.chunks == [] and fake.finished
+	assert len(app._session.requests) == 1
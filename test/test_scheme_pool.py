@@ -0,0 +1,74 @@
+import threading
+import time
+
+from fakes import FakeRequest, FakeTask
+from WKWebView import WKWebView
+
+Pool = WKWebView._urlSchemeTaskPool
+
+
+def start(pool, count, done=None, first=0):
+	tasks = [FakeTask(done) for i in range(count)]
+	for i, task in enumerate(tasks, first):
+		pool.task_start(i, task, FakeRequest(f'app://localhost/asset/{i}.js'))
+	return tasks
+
+
+def wait_for(condition, timeout=5):
+	deadline = time.monotonic() + timeout
+	while not condition():
+		assert time.monotonic() < deadline
+		time.sleep(0.005)
+
+
+def test_scales_from_load():
+	release = threading.Event()
+
+	def handler(task):
+		release.wait(5)
+		task.finish(data=b'ok')
+
+	pool = Pool({'app': handler}, min_workers=1, max_workers=4)
+	try:
+		start(pool, 1)
+		assert len(pool.workers) == 1 # a load of 1 is served by the warm worker
+		start(pool, 7, first=1)
+		assert len(pool.workers) == 4
+		assert pool.load == 2.0
+		release.set()
+		wait_for(lambda: pool.outstanding == 0)
+		assert pool.load == 0.0
+	finally:
+		release.set()
+		pool.stop()
+
+
+def test_target_load():
+	release = threading.Event()
+
+	def handler(task):
+		release.wait(5)
+		task.finish(data=b'ok')
+
+	pool = Pool({'app': handler}, min_workers=1, max_workers=8, target_load=2.0)
+	try:
+		start(pool, 6)
+		assert len(pool.workers) == 3
+	finally:
+		release.set()
+		pool.stop()
+
+
+def test_tasks_finish_and_idle_workers_retire():
+	finished = []
+	pool = Pool({'app': lambda task: task.finish(data=b'x' * 10)},
+	            min_workers=1, max_workers=4, idle_timeout=0.05)
+	try:
+		tasks = start(pool, 50, finished.append)
+		wait_for(lambda: len(finished) == 50)
+		assert all(task.chunks == [10] for task in tasks)
+		wait_for(lambda: len(pool.workers) == 1)
+		assert pool.workers[0].core
+		assert pool.tasks == {}
+	finally:
+		pool.stop()
@@ -0,0 +1,18 @@
+import urllib.request
+
+import pytest
+
+from WKApp import WKApp
+
+
+@pytest.mark.parametrize('backend', ['wsgiref', 'threaded'])
+def test_port_zero_uses_bound_port(tmp_path, backend):
+	app = WKApp(str(tmp_path), port=0, server_backend=backend, static_index=False)
+	try:
+		app.start_server()
+		assert app.port != 0
+		assert app.server.port == app.port
+		with urllib.request.urlopen(f'{app.base_url}/static/wkapp.js', timeout=5) as response:
+			assert response.status == 200
+	finally:
+		app.cleanup()
@@ -0,0 +1,166 @@
+import gzip
+import os
+
+import bottle
+import pytest
+
+from WKApp import WKApp, WKAppStatic, WKAppWatcher
+
+
+def write(path, data):
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	with open(path, 'wb') as file:
+		file.write(data)
+
+
+def get(static, filepath, **headers):
+	environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/static/' + filepath}
+	environ.update(('HTTP_' + name.upper(), value) for name, value in headers.items())
+	bottle.request.bind(environ)
+	return static.serve(filepath)
+
+
+def body(response):
+	data = b''.join(response.body) if not hasattr(response.body, 'read') else response.body.read()
+	if hasattr(response.body, 'close'):
+		response.body.close()
+	return data
+
+
+script = b'function f() { return 1; }\n' * 100
+
+
+@pytest.fixture
+def static(tmp_path):
+	root = str(tmp_path / 'static')
+	write(os.path.join(root, 'app.js'), script)
+	write(os.path.join(root, 'small.txt'), b'0123456789')
+	static = WKAppStatic([root], str(tmp_path / 'static-cache'))
+	static.build()
+	return static
+
+
+@pytest.mark.parametrize('value, expected', [
+ ('bytes=0-4', (0, 4)),
+ ('bytes=5-', (5, 9)),
+ ('bytes=-3', (7, 9)),
+ ('bytes=-20', (0, 9)),
+ ('bytes=8-20', (8, 9)),
+ ('bytes=10-', None),
+ ('bytes=5-4', None),
+ ('bytes=-0', None),
+ ('bytes=0-1,3-4', False),
+ ('items=0-4', False),
+ ('bytes=a-b', False),
+ ('', False),
+])
+def test_parse_range(value, expected):
+	assert WKAppStatic.parse_range(value, 10) == expected
+
+
+@pytest.mark.parametrize('value, expected', [
+ ('gzip, deflate, br', ['gzip', 'deflate', 'br']),
+ ('gzip;q=0.5, br', ['br', 'gzip']),
+ ('br;q=0, gzip', ['gzip']),
+ ('GZIP;q=bad, *', ['*']),
+ ('', []),
+ (None, []),
+])
+def test_accepted_encodings(value, expected):
+	assert WKAppStatic.accepted_encodings(value) == expected
+
+
+def test_range_request(static):
+	response = get(static, 'small.txt', range='bytes=2-5')
+	assert response.status_code == 206
+	assert response.headers['Content-Range'] == 'bytes 2-5/10'
+	assert body(response) == b'2345'
+
+
+def test_unsatisfiable_range(static):
+	response = get(static, 'small.txt', range='bytes=10-')
+	assert response.status_code == 416
+	assert response.headers['Content-Range'] == 'bytes */10'
+
+
+def test_sidecar_selected_by_accept_encoding(static):
+	assert static.precompress() > 0
+	response = get(static, 'app.js', accept_encoding='br;q=0, gzip')
+	assert response.headers['Content-Encoding'] == 'gzip'
+	assert gzip.decompress(body(response)) == script
+	response = get(static, 'app.js')
+	assert not 'Content-Encoding' in response.headers
+	assert body(response) == script
+	# ranges are of the identity encoding
+	response = get(static, 'app.js', accept_encoding='gzip', range='bytes=0-7')
+	assert not 'Content-Encoding' in response.headers
+	assert body(response) == script[:8]
+
+
+def test_sidecar_next_to_file(tmp_path):
+	root = str(tmp_path / 'static')
+	write(os.path.join(root, 'app.js'), script)
+	write(os.path.join(root, 'app.js.gz'), gzip.compress(script))
+	static = WKAppStatic([root])
+	static.build()
+	response = get(static, 'app.js', accept_encoding='gzip')
+	assert response.headers['Content-Encoding'] == 'gzip'
+	assert gzip.decompress(body(response)) == script
+
+
+def test_fingerprinted_name_is_immutable(static):
+	name = static.hashed_name('app.js')
+	assert name != 'app.js'
+	response = get(static, name)
+	assert response.headers['Cache-Control'] == static.immutable
+	assert body(response) == script
+	response = get(static, 'app.js')
+	assert response.headers['Cache-Control'] == 'no-cache'
+	# a fingerprint from before the file changed serves the current file revalidated
+	response = get(static, 'app.0123456789ab.js')
+	assert response.headers['Cache-Control'] == 'no-cache'
+	assert body(response) == script
+
+
+@pytest.mark.parametrize('directory', ['static-cache', 'views-cache', 'proxy-cache', '__pycache__', '.git'])
+def test_generated_directories_not_indexed(tmp_path, directory):
+	root = str(tmp_path)
+	write(os.path.join(root, 'app.js'), script)
+	write(os.path.join(root, directory, 'generated.js'), script)
+	static = WKAppStatic([root], search_roots=[root])
+	assert static.build() == 1
+	assert static.lookup(f'{directory}/generated.js') is None
+	assert get(static, f'{directory}/generated.js').status_code == 404
+	watcher = WKAppWatcher([root], None)
+	assert list(watcher.scan()) == [os.path.join(root, 'app.js')]
+
+
+def test_app_root_searched_first(tmp_path):
+	root = str(tmp_path)
+	write(os.path.join(root, 'app.js'), b'root')
+	write(os.path.join(root, 'static', 'app.js'), b'static')
+	write(os.path.join(root, 'static', 'only.js'), b'only')
+	app = WKApp(root, static_precompress=False)
+	try:
+		bottle.request.bind({'REQUEST_METHOD': 'GET'})
+		assert body(app.static_file('app.js')) == b'root'
+		assert body(app.static_file('only.js')) == b'only'
+		with open(os.path.join(app.module_static_path, 'wkapp.js'), 'rb') as module_file:
+			assert body(app.static_file('wkapp.js')) == module_file.read()
+	finally:
+		app.cleanup()
+
+
+def test_immutable_rate_counts_requests(static):
+	assert static.stats['immutable_rate'] is None
+	# references alone are not requests
+	names = [static.hashed_name('app.js') for i in range(12)]
+	assert static.stats['requests'] == 0
+	response = get(static, names[0])
+	body(response)
+	get(static, names[0], if_none_match=response.headers['ETag'])
+	body(get(static, 'small.txt'))
+	get(static, 'missing.txt')
+	stats = static.stats
+	assert (stats['requests'], stats['fingerprinted'], stats['not_modified']) == (3, 2, 1)
+	assert stats['immutable_rate'] == pytest.approx(2 / 3)
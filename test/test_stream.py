@@ -0,0 +1,86 @@
+from unittest import mock
+
+import pytest
+
+from fakes import FakeRequest, FakeTask
+from WKWebView import WKWebView
+
+Pool = WKWebView._urlSchemeTaskPool
+
+
+def scheme_task(url='app://localhost/bundle.wasm'):
+	pool = Pool({})
+	task = FakeTask()
+	return Pool._urlSchemeTask(pool, 1, task, FakeRequest(url)), task
+
+
+class Source:
+	# an iterable producing a large body in chunks, recording how far it runs ahead of the task
+
+	def __init__(self, task, sizes):
+		self.task = task
+		self.sizes = sizes
+		self.produced = 0
+		self.peak = 0
+		self.closed = False
+
+	def __iter__(self):
+		for size in self.sizes:
+			self.produced += size
+			self.peak = max(self.peak, self.produced - sum(self.task.chunks))
+			yield b'x' * size
+
+	def close(self):
+		self.closed = True
+
+
+@pytest.mark.parametrize('sizes', [
+ [65536] * 8,
+ [1000, 200000, 3, 65537, 0, 131072],
+ [1] * 100,
+])
+def test_stream_chunks_and_peak_buffering(sizes):
+	chunk_size = 65536
+	task, fake = scheme_task()
+	source = Source(fake, sizes)
+	task.stream(source, content_type='application/wasm', length=sum(sizes), chunk_size=chunk_size)
+	assert sum(fake.chunks) == sum(sizes)
+	assert max(fake.chunks) <= chunk_size
+	assert not 0 in fake.chunks
+	# only the chunk the source just produced is ever held
+	assert source.peak <= max(sizes)
+	assert len(fake.responses) == 1
+	assert fake.finished
+	assert source.closed
+
+
+def test_stream_header_length():
+	task, fake = scheme_task()
+	with mock.patch.object(WKWebView, 'NSHTTPURLResponse') as response_class:
+		task.stream(iter([b'abc', b'de']), content_type='text/plain', length=5)
+	_, status, _, headers = response_class.new().initWithURL_statusCode_HTTPVersion_headerFields_.call_args[0]
+	assert status == 200
+	assert headers['Content-Length'] == '5'
+	assert headers['Content-Type'] == 'text/plain'
+	assert fake.chunks == [3, 2]
+
+
+def test_stream_unknown_length_is_chunked():
+	task, fake = scheme_task()
+	with mock.patch.object(WKWebView, 'NSHTTPURLResponse') as response_class:
+		task.stream(iter([b'abc']))
+	headers = response_class.new().initWithURL_statusCode_HTTPVersion_headerFields_.call_args[0][3]
+	assert not 'Content-Length' in headers
+
+
+def test_stream_stops_when_task_is_stopped():
+	task, fake = scheme_task()
+
+	def source():
+		yield b'a' * 10
+		task.stopped = True
+		yield b'b' * 10
+
+	task.stream(source())
+	assert fake.chunks == [10]
+	assert not fake.finished
@@ -0,0 +1,77 @@
+import os
+import shutil
+
+import pytest
+
+from WKApp import WKApp
+
+views = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'views')
+
+
+@pytest.fixture
+def root(tmp_path):
+	shutil.copytree(views, tmp_path / 'views')
+	return str(tmp_path)
+
+
+def load_all(root, **kwargs):
+	app = WKApp(root, static_index=False, **kwargs)
+	try:
+		app.warmup(instantiate=False)
+		return app.template_stats
+	finally:
+		app.cleanup()
+
+
+def test_cold_start_compiles_and_warm_start_loads_cached_modules(root):
+	cold = load_all(root)
+	assert cold['compiles'] > 0
+	assert cold['module_loads'] == 0
+	warm = load_all(root)
+	assert warm['compiles'] == 0
+	assert warm['module_loads'] == cold['compiles']
+
+
+def test_changed_template_is_recompiled(root):
+	cold = load_all(root)
+	with open(os.path.join(root, 'views', 'index.html'), 'a') as view_file:
+		view_file.write('\n<!-- changed -->\n')
+	warm = load_all(root)
+	assert warm['compiles'] == 1
+	assert warm['module_loads'] == cold['compiles'] - 1
+
+
+def test_without_views_cache_every_load_compiles(root):
+	cold = load_all(root, views_cache=False)
+	assert cold['compiles'] > 0
+	assert load_all(root, views_cache=False)['compiles'] == cold['compiles']
+
+
+def test_deprecated_template_aliases_render(tmp_path):
+	import WKApp as wkapp
+	(tmp_path / 'plain.html').write_text('Hello ${name}')
+	with pytest.warns(DeprecationWarning):
+		assert wkapp.template('Hello ${name}', name='a') == 'Hello a'
+	with pytest.warns(DeprecationWarning):
+		assert wkapp.wkapp_template('Hello ${name}', name='b') == 'Hello b'
+	lookup = wkapp.WKViewsLookup(directories=[str(tmp_path)])
+	with pytest.warns(DeprecationWarning):
+		body = wkapp.wkapp_template('plain.html', template_lookup=[str(tmp_path)],
+		                            template_settings={'template_lookup': lookup}, name='c')
+	assert body == 'Hello c'
+	assert lookup.stats['compiles'] == 1
+
+
+def test_warmup_skips_query_keyed_views(root):
+	with open(os.path.join(root, 'views', 'keyed.html'), 'w') as view_file:
+		view_file.write('<%!\nclass KeyedView:\n\tview_key = ("id",)\n\nview_class = KeyedView\n%>\n${view.path}\n')
+	app = WKApp(root, static_index=False)
+	try:
+		timings = app.warmup()
+		assert not timings['/keyed.html'] is None
+		assert not timings['/test_view.html'] is None
+		keys = list(app.views.views.keys())
+		assert '/test_view.html' in keys
+		assert not any(key.startswith('/keyed.html') for key in keys)
+	finally:
+		app.cleanup()